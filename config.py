@@ -38,6 +38,12 @@ class AIConfig:
     
     # Sentence Transformers
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    
+    # Embedding backend: "sentence-transformers" (PyTorch) or "onnx" (ONNX Runtime export)
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+    onnx_model_path: str = os.getenv("ONNX_MODEL_PATH", "./minilm-onnx")
+    # Device the encoder is pinned to ("cpu", "cuda", "cuda:1", ...)
+    embedding_device: str = os.getenv("EMBEDDING_DEVICE", "cpu").lower()
 
 @dataclass
 class ProcessingConfig:
@@ -117,6 +123,10 @@ class SystemConfig:
         if not self.ai.anthropic_api_key:
             errors.append("ANTHROPIC_API_KEY is required")
         
+        # Check embedding backend
+        if self.ai.embedding_backend not in ("sentence-transformers", "onnx"):
+            errors.append("EMBEDDING_BACKEND must be 'sentence-transformers' or 'onnx'")
+        
         # Check file size limits
         if self.processing.max_file_size <= 0:
             errors.append("MAX_FILE_SIZE must be positive")
@@ -1,7 +1,96 @@
 import os
 import re
-from typing import List, Dict, Any
+import mmap
+import multiprocessing
+from typing import List, Dict, Any, Iterator
+from collections import Counter
+from functools import lru_cache
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+# Cleaning patterns used by DocumentProcessor._clean_content
+_RE_WS = re.compile(r'\s+')
+_RE_HASH_COMMENT = re.compile(r'^\s*#.*$', re.MULTILINE)
+_RE_SLASH_COMMENT = re.compile(r'^\s*//.*$', re.MULTILINE)
+_RE_BLOCK_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+# Only strip comments in languages where they are comments (a markdown "# Heading" is content)
+_HASH_COMMENT_SUFFIXES = ('.py', '.yml', '.yaml')
+_SLASH_COMMENT_SUFFIXES = ('.java', '.js')
+
+# Files at least this large are decoded straight from a memory map instead of a read() copy
+_MMAP_THRESHOLD = 64 * 1024
+
+# Capability indicators recognised in path parts, in priority order
+_CAPABILITY_INDICATORS = ('EKYC', 'PANNSDL', 'OTP', 'VERIFICATION')
+
+
+@lru_cache(maxsize=8192)
+def _capability_for(path_parts: tuple) -> str:
+    """Extract capability name from file path parts (cached per path)"""
+    # Look for capability indicators in path
+    for part in path_parts:
+        part_upper = part.upper()
+        for indicator in _CAPABILITY_INDICATORS:
+            if indicator in part_upper:
+                return indicator
+                
+    # Check if it's in Capabilities directory
+    if 'Capabilities' in path_parts:
+        # Find the capability directory name
+        cap_index = path_parts.index('Capabilities')
+        if cap_index + 1 < len(path_parts):
+            return path_parts[cap_index + 1].upper()
+            
+    # Check if it's in CommonPrompts
+    if 'CommonPrompts' in path_parts:
+        return 'COMMON'
+        
+    return 'GENERAL'
+
+
+@lru_cache(maxsize=8192)
+def _content_type_for(file_path: str) -> str:
+    """Determine content type based on file extension and path (cached per path)"""
+    file_path_lower = file_path.lower()
+    
+    if file_path_lower.endswith('.java'):
+        return 'java_code'
+    elif file_path_lower.endswith('.py'):
+        return 'python_code'
+    elif file_path_lower.endswith('.js'):
+        return 'javascript_code'
+    elif file_path_lower.endswith('.json'):
+        return 'json_config'
+    elif file_path_lower.endswith(('.yml', '.yaml')):
+        return 'yaml_config'
+    elif file_path_lower.endswith('.xml'):
+        return 'xml_config'
+    elif file_path_lower.endswith('.md'):
+        return 'markdown_doc'
+    elif 'prompt' in file_path_lower:
+        return 'prompt_template'
+    elif 'guideline' in file_path_lower:
+        return 'guideline_doc'
+    else:
+        return 'text_document'
+
+
+def _process_one_file(processor: 'DocumentProcessor', file_path: Path, capability: str) -> List[Dict[str, Any]]:
+    """Read and chunk a single file (module level so it can run in a worker process)"""
+    try:
+        content = processor._read_file(file_path)
+        if not content:
+            return []
+        
+        chunks = processor._chunk_content(content, str(file_path), capability)
+        print(f"📄 Processed: {file_path.name} ({len(chunks)} chunks)")
+        return chunks
+    
+    except Exception as e:
+        print(f"⚠️ Error processing {file_path}: {e}")
+        return []
 
 
 class DocumentProcessor:
@@ -10,10 +99,32 @@ class DocumentProcessor:
     from the lending directory structure.
     """
     
+    # Fewer files than this are chunked in-process instead of in a process pool
+    PROCESS_POOL_MIN_FILES = 32
+    
+    # Directories never descended into while scanning; these are the directories the
+    # excluded path patterns already rejected every file under
+    EXCLUDED_DIRS = frozenset({'node_modules', '.git', '__pycache__', 'test', 'spec'})
+    
     def __init__(self):
         self.supported_extensions = {'.txt', '.md', '.xml', '.java', '.py', '.js', '.json', '.yml', '.yaml'}
         self.chunk_size = 1000  # Characters per chunk
         self.chunk_overlap = 200  # Overlap between chunks
+        self.max_workers = os.cpu_count()  # Upper bound on worker processes used by iter_chunks
+        
+        excluded_patterns = [
+            'package-lock.json',
+            'node_modules',
+            '.git',
+            '__pycache__',
+            '.pyc',
+            '/test/',
+            '/spec/',
+            'test.py',
+            'spec.py'
+        ]
+        # One alternation regex instead of a substring scan per pattern
+        self._excluded_re = re.compile('|'.join(re.escape(p) for p in excluded_patterns))
         
     def extract_documents(self, lending_dir: str) -> List[Dict[str, Any]]:
         """
@@ -26,6 +137,25 @@ class DocumentProcessor:
             List of document chunks with metadata
         """
         documents = []
+        sources = set()
+        
+        for chunks in self.iter_chunks(lending_dir):
+            documents.extend(chunks)
+            sources.add(chunks[0]['source'])
+            
+        print(f"✅ Extracted {len(documents)} document chunks from {len(sources)} files")
+        return documents
+        
+    def iter_chunks(self, lending_dir: str) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Lazily extract documents from the lending directory, one file at a time.
+        
+        Args:
+            lending_dir: Path to the lending directory
+            
+        Yields:
+            The (non-empty) list of chunks for each processed file
+        """
         lending_path = Path(lending_dir)
         
         if not lending_path.exists():
@@ -33,104 +163,89 @@ class DocumentProcessor:
             
         print(f"📁 Scanning directory: {lending_path}")
         
-        # Walk through all files in the directory
-        for file_path in self._get_all_files(lending_path):
-            try:
-                # Determine capability from path
-                capability = self._extract_capability_from_path(file_path)
-                
-                # Read and process file
-                content = self._read_file(file_path)
-                if content:
-                    chunks = self._chunk_content(content, str(file_path), capability)
-                    documents.extend(chunks)
-                    print(f"📄 Processed: {file_path.name} ({len(chunks)} chunks)")
-                    
-            except Exception as e:
-                print(f"⚠️ Error processing {file_path}: {e}")
-                continue
-                
-        print(f"✅ Extracted {len(documents)} document chunks from {len(set(doc['source'] for doc in documents))} files")
-        return documents
+        # Resolve capabilities up front, then read/clean/chunk files across CPUs
+        file_paths = self._get_all_files(lending_path)
+        capabilities = [self._extract_capability_from_path(file_path) for file_path in file_paths]
         
+        # Small trees are cheaper to process in-process than to start worker processes for
+        if len(file_paths) < self.PROCESS_POOL_MIN_FILES:
+            for file_path, capability in zip(file_paths, capabilities):
+                chunks = _process_one_file(self, file_path, capability)
+                if chunks:
+                    yield chunks
+            return
+            
+        # forkserver: this runs from a worker thread of a multithreaded server process,
+        # where plain fork() can copy locks held by other threads
+        max_workers = min(self.max_workers or os.cpu_count() or 1, len(file_paths))
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("forkserver")) as executor:
+            for chunks in executor.map(_process_one_file, repeat(self), file_paths, capabilities, chunksize=16):
+                if chunks:
+                    yield chunks
+                    
     def _get_all_files(self, directory: Path) -> List[Path]:
         """Get all supported files from directory recursively"""
         files = []
         
-        for item in directory.rglob('*'):
-            if item.is_file() and item.suffix.lower() in self.supported_extensions:
+        for entry in self._scandir_recursive(directory):
+            if os.path.splitext(entry.name)[1].lower() in self.supported_extensions:
                 # Skip hidden files and common non-content files
-                if not item.name.startswith('.') and not self._is_excluded_file(item):
-                    files.append(item)
+                if not entry.name.startswith('.') and not self._is_excluded_file(entry.path):
+                    files.append(Path(entry.path))
                     
         return files
         
-    def _is_excluded_file(self, file_path: Path) -> bool:
+    def _scandir_recursive(self, path):
+        """Yield file DirEntry objects below path, using scandir's cached type info"""
+        with os.scandir(path) as it:
+            for entry in it:
+                # Symlinked directories are not followed (avoids cycles); symlinked files are indexed
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in self.EXCLUDED_DIRS:
+                        continue
+                    yield from self._scandir_recursive(entry.path)
+                elif entry.is_file():
+                    yield entry
+                    
+    def _is_excluded_file(self, file_path) -> bool:
         """Check if file should be excluded from processing"""
-        excluded_patterns = [
-            'package-lock.json',
-            'node_modules',
-            '.git',
-            '__pycache__',
-            '.pyc',
-            '/test/',
-            '/spec/',
-            'test.py',
-            'spec.py'
-        ]
+        return bool(self._excluded_re.search(str(file_path).lower()))
         
-        file_str = str(file_path).lower()
-        return any(pattern in file_str for pattern in excluded_patterns)
+    def _decode_file_bytes(self, data) -> str:
+        """Decode file bytes (or any bytes-like buffer) as UTF-8, falling back to latin-1 (which accepts any byte)"""
+        try:
+            content = str(data, 'utf-8')
+        except UnicodeDecodeError:
+            content = str(data, 'latin-1')
+            
+        # Translate newlines like a text-mode read, so sizes and offsets exclude '\r'
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+            
+        # Basic content validation
+        if len(content.strip()) < 10:  # Skip very short files
+            return None
+            
+        return content
         
     def _read_file(self, file_path: Path) -> str:
         """Read file content with proper encoding handling"""
-        encodings = ['utf-8', 'latin-1', 'cp1252']
-        
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
+        try:
+            with open(file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < _MMAP_THRESHOLD:
+                    return self._decode_file_bytes(f.read())
                     
-                # Basic content validation
-                if len(content.strip()) < 10:  # Skip very short files
-                    return None
+                # Decode directly from the page cache without an intermediate bytes copy
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return self._decode_file_bytes(mapped)
                     
-                return content
-                
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                print(f"⚠️ Error reading {file_path}: {e}")
-                return None
-                
-        print(f"⚠️ Could not decode {file_path} with any encoding")
-        return None
-        
+        except Exception as e:
+            print(f"⚠️ Error reading {file_path}: {e}")
+            return None
+            
     def _extract_capability_from_path(self, file_path: Path) -> str:
         """Extract capability name from file path"""
-        path_parts = file_path.parts
-        
-        # Look for capability indicators in path
-        capability_indicators = ['EKYC', 'PANNSDL', 'OTP', 'VERIFICATION']
-        
-        for part in path_parts:
-            part_upper = part.upper()
-            for indicator in capability_indicators:
-                if indicator in part_upper:
-                    return indicator
-                    
-        # Check if it's in Capabilities directory
-        if 'Capabilities' in path_parts:
-            # Find the capability directory name
-            cap_index = path_parts.index('Capabilities')
-            if cap_index + 1 < len(path_parts):
-                return path_parts[cap_index + 1].upper()
-                
-        # Check if it's in CommonPrompts
-        if 'CommonPrompts' in path_parts:
-            return 'COMMON'
-            
-        return 'GENERAL'
+        return _capability_for(Path(file_path).parts)
         
     def _chunk_content(self, content: str, source_file: str, capability: str) -> List[Dict[str, Any]]:
         """
@@ -145,7 +260,11 @@ class DocumentProcessor:
             List of document chunks
         """
         # Clean and normalize content
-        cleaned_content = self._clean_content(content)
+        cleaned_content = self._clean_content(content, source_file)
+        
+        # Invariant across every chunk of this file
+        content_type = self._determine_content_type(source_file)
+        file_size = len(content)
         
         if len(cleaned_content) <= self.chunk_size:
             # Content is small enough to be a single chunk
@@ -153,10 +272,10 @@ class DocumentProcessor:
                 'content': cleaned_content,
                 'source': source_file,
                 'chunk_id': 0,
-                'type': self._determine_content_type(source_file),
+                'type': content_type,
                 'capability': capability,
                 'metadata': {
-                    'file_size': len(content),
+                    'file_size': file_size,
                     'chunk_count': 1
                 }
             }]
@@ -172,16 +291,12 @@ class DocumentProcessor:
             
             # If this isn't the last chunk, try to break at a sentence or paragraph
             if end < len(cleaned_content):
-                # Look for good break points (sentence endings, paragraphs)
-                break_points = [
-                    cleaned_content.rfind('\n\n', start, end),  # Paragraph break
-                    cleaned_content.rfind('. ', start, end),    # Sentence break
-                    cleaned_content.rfind('\n', start, end),    # Line break
-                ]
-                
-                # Use the best break point found
-                for break_point in break_points:
-                    if break_point > start + self.chunk_size // 2:  # Don't break too early
+                # Look for good break points (paragraphs, then sentences, then lines),
+                # only searching the half of the window where a break is acceptable
+                earliest_break = start + self.chunk_size // 2 + 1  # Don't break too early
+                for delimiter in ('\n\n', '. ', '\n'):
+                    break_point = cleaned_content.rfind(delimiter, earliest_break, end)
+                    if break_point != -1:
                         end = break_point + 1
                         break
                         
@@ -192,10 +307,10 @@ class DocumentProcessor:
                     'content': chunk_content,
                     'source': source_file,
                     'chunk_id': chunk_id,
-                    'type': self._determine_content_type(source_file),
+                    'type': content_type,
                     'capability': capability,
                     'metadata': {
-                        'file_size': len(content),
+                        'file_size': file_size,
                         'chunk_count': -1,  # Will be updated after all chunks are created
                         'start_pos': start,
                         'end_pos': end
@@ -207,76 +322,49 @@ class DocumentProcessor:
             start = max(start + self.chunk_size - self.chunk_overlap, end)
             
         # Update chunk count in metadata
+        chunk_count = len(chunks)
         for chunk in chunks:
-            chunk['metadata']['chunk_count'] = len(chunks)
+            chunk['metadata']['chunk_count'] = chunk_count
             
         return chunks
         
-    def _clean_content(self, content: str) -> str:
+    def _clean_content(self, content: str, source_file: str = '') -> str:
         """Clean and normalize content for better processing"""
-        # Remove excessive whitespace
-        content = re.sub(r'\s+', ' ', content)
-        
-        # Remove common file artifacts
-        content = re.sub(r'^\s*#.*$', '', content, flags=re.MULTILINE)  # Remove comment lines
-        content = re.sub(r'^\s*//.*$', '', content, flags=re.MULTILINE)  # Remove // comments
-        content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)  # Remove /* */ comments
+        source_lower = source_file.lower()
         
-        # Normalize line endings
+        # Normalize line endings first so the line-anchored comment patterns see real lines
         content = content.replace('\r\n', '\n').replace('\r', '\n')
         
-        # Remove excessive blank lines
-        content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
+        # Remove comments for the source's language
+        if source_lower.endswith(_SLASH_COMMENT_SUFFIXES):
+            content = _RE_BLOCK_COMMENT.sub('', content)  # Remove /* */ comments
+            content = _RE_SLASH_COMMENT.sub('', content)  # Remove // comments
+        elif source_lower.endswith(_HASH_COMMENT_SUFFIXES):
+            content = _RE_HASH_COMMENT.sub('', content)  # Remove comment lines
+        
+        # Collapse whitespace last; doing it first removed the line starts the comment patterns need
+        content = _RE_WS.sub(' ', content)
         
         return content.strip()
         
     def _determine_content_type(self, file_path: str) -> str:
         """Determine content type based on file extension and path"""
-        file_path_lower = file_path.lower()
+        return _content_type_for(file_path)
         
-        if file_path_lower.endswith('.java'):
-            return 'java_code'
-        elif file_path_lower.endswith('.py'):
-            return 'python_code'
-        elif file_path_lower.endswith('.js'):
-            return 'javascript_code'
-        elif file_path_lower.endswith('.json'):
-            return 'json_config'
-        elif file_path_lower.endswith(('.yml', '.yaml')):
-            return 'yaml_config'
-        elif file_path_lower.endswith('.xml'):
-            return 'xml_config'
-        elif file_path_lower.endswith('.md'):
-            return 'markdown_doc'
-        elif 'prompt' in file_path_lower:
-            return 'prompt_template'
-        elif 'guideline' in file_path_lower:
-            return 'guideline_doc'
-        else:
-            return 'text_document'
-            
     def get_processing_stats(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Get statistics about processed documents"""
         if not documents:
             return {"total_documents": 0, "total_chunks": 0}
             
-        # Count by capability
-        capability_counts = {}
-        type_counts = {}
-        source_files = set()
+        # Count by capability and type
+        capability_counts = Counter(doc.get('capability', 'UNKNOWN') for doc in documents)
+        type_counts = Counter(doc.get('type', 'unknown') for doc in documents)
+        source_files = {doc['source'] for doc in documents}
         
-        for doc in documents:
-            capability = doc.get('capability', 'UNKNOWN')
-            doc_type = doc.get('type', 'unknown')
-            
-            capability_counts[capability] = capability_counts.get(capability, 0) + 1
-            type_counts[doc_type] = type_counts.get(doc_type, 0) + 1
-            source_files.add(doc['source'])
-            
         return {
             "total_documents": len(source_files),
             "total_chunks": len(documents),
-            "capabilities": capability_counts,
-            "content_types": type_counts,
+            "capabilities": dict(capability_counts),
+            "content_types": dict(type_counts),
             "average_chunks_per_document": len(documents) / len(source_files) if source_files else 0
         }
\ No newline at end of file
@@ -3,6 +3,9 @@ from chromadb.config import Settings
 from typing import List, Dict, Any
 import os
 import asyncio
+import hashlib
+import json
+import numpy as np
 from pathlib import Path
 
 try:
@@ -13,9 +16,62 @@ except ImportError as e:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
     SentenceTransformer = None
 
+# Optional ONNX Runtime backend for faster CPU encoding
+try:
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
 from .document_processor import DocumentProcessor
 
 
+class OnnxSentenceEncoder:
+    """
+    Minimal SentenceTransformer-compatible encoder backed by ONNX Runtime.
+    
+    Expects a directory holding an ONNX export of all-MiniLM-L6-v2, e.g.
+    ``optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2
+    --task feature-extraction --optimize O3 ./minilm-onnx``.
+    """
+    
+    def __init__(self, model_path: str, device: str = "cpu"):
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = os.cpu_count()
+        provider = "CUDAExecutionProvider" if device.startswith("cuda") else "CPUExecutionProvider"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_path, session_options=session_options, provider=provider
+        )
+        
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False):
+        """Mean-pooled sentence embeddings as a (len(sentences), dim) float32 array"""
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                return_tensors='np'
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            
+            # Mean pooling over non-padding tokens
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32, copy=False))
+            
+        if not batches:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        return np.concatenate(batches)
+
+
 class VectorService:
     """
     Vector service for semantic document search using Chroma DB.
@@ -26,20 +82,41 @@ class VectorService:
     - Vector database management
     """
     
-    def __init__(self, persist_directory: str = "./vector/chroma_db"):
+    # Chunks embedded and stored per step while streaming a directory
+    STREAM_BATCH_SIZE = 256
+    
+    def __init__(self, persist_directory: str = "./vector/chroma_db",
+                 use_onnx: bool = False, onnx_model_path: str = "./minilm-onnx", device: str = "cpu"):
         self.persist_directory = persist_directory
         self.client = None
         self.collection = None
+        self.encoder = None
         
-        if SENTENCE_TRANSFORMERS_AVAILABLE:
+        if use_onnx:
+            if ONNX_AVAILABLE:
+                try:
+                    self.encoder = OnnxSentenceEncoder(onnx_model_path, device=device)
+                    print(f"⚡ Using ONNX Runtime encoder from {onnx_model_path} on {device}")
+                except Exception as e:
+                    print(f"⚠️ Failed to load ONNX encoder, falling back to SentenceTransformer: {e}")
+            else:
+                print("⚠️ ONNX Runtime backend requested but optimum/onnxruntime are not installed")
+                
+        if self.encoder is None and SENTENCE_TRANSFORMERS_AVAILABLE:
             try:
-                self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
+                # Pin the model to one device instead of letting it pick per process
+                self.encoder = SentenceTransformer('all-MiniLM-L6-v2', device=device)
             except Exception as e:
                 print(f"⚠️ Failed to load SentenceTransformer model: {e}")
                 self.encoder = None
-        else:
-            self.encoder = None
-            
+                
+        if self.encoder is not None:
+            # Run one encode now so model/BLAS initialisation doesn't land on the first search
+            try:
+                self.encoder.encode(["warmup"], convert_to_numpy=True, show_progress_bar=False)
+            except Exception as e:
+                print(f"⚠️ Encoder warmup failed: {e}")
+                
         self.document_processor = DocumentProcessor()
         
     async def initialize(self):
@@ -73,45 +150,119 @@ class VectorService:
         """
         print(f"📁 Processing documents from: {lending_path}")
         
-        # Clear existing documents
-        if self.collection.count() > 0:
-            print("🗑️ Clearing existing vector store...")
-            self.client.delete_collection("lending_context")
-            self.collection = self.client.create_collection(
-                name="lending_context",
-                metadata={"hnsw:space": "cosine"}
-            )
-        
-        # Extract documents
-        documents = await asyncio.to_thread(
-            self.document_processor.extract_documents, lending_path
-        )
-        
-        if not documents:
-            print("⚠️ No documents found to process")
+        if not self.encoder:
+            print("⚠️ Cannot add documents: SentenceTransformer encoder not available")
             return {"documents_processed": 0, "chunks_created": 0}
             
-        # Process documents in batches
-        batch_size = 50
+        # Stream chunks file by file and embed them in fixed-size batches, so neither
+        # the full chunk list nor the full embedding matrix is ever held in memory.
+        # The process pool keeps chunking ahead while a batch is being encoded.
+        file_chunks = self.document_processor.iter_chunks(lending_path)
+        batch = []
+        sources = set()
+        # (capability, content digest) -> (id, source) of the first chunk stored with that content
+        seen_content = {}
+        duplicate_sources = {}  # First chunk id -> other sources with identical content
+        written_ids = set()
         total_chunks = 0
+        duplicate_chunks = 0
         
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            await self._add_document_batch(batch)
-            total_chunks += len(batch)
-            print(f"📊 Processed {total_chunks}/{len(documents)} document chunks")
+        try:
+            while True:
+                chunks = await asyncio.to_thread(next, file_chunks, None)
+                if chunks is not None:
+                    sources.add(chunks[0]['source'])
+                    for chunk in chunks:
+                        # Boilerplate (license headers, copied files) is embedded once per capability,
+                        # so capability-filtered searches still find it
+                        digest = hashlib.blake2b(chunk['content'].encode('utf-8'), digest_size=16).digest()
+                        key = (chunk.get('capability'), digest)
+                        if key in seen_content:
+                            first_id, first_source = seen_content[key]
+                            other_sources = duplicate_sources.setdefault(first_id, [])
+                            if chunk['source'] != first_source and chunk['source'] not in other_sources:
+                                other_sources.append(chunk['source'])
+                            duplicate_chunks += 1
+                            continue
+                        seen_content[key] = (self._document_id(chunk), chunk['source'])
+                        batch.append(chunk)
+                    
+                if batch and (chunks is None or len(batch) >= self.STREAM_BATCH_SIZE):
+                    await self._add_document_batch(batch)
+                    written_ids.update(self._document_id(doc) for doc in batch)
+                    total_chunks += len(batch)
+                    print(f"📊 Processed {total_chunks} document chunks")
+                    batch = []
+                    
+                if chunks is None:
+                    break
+        finally:
+            # Shut the chunking generator and its process pool down even if a batch failed
+            file_chunks.close()
+            
+        self._record_duplicate_sources(duplicate_sources)
+        
+        # Upserts only overwrite ids written in this run; drop static chunks left over
+        # from files that have since shrunk or been deleted
+        stale_chunks = self._delete_stale_static_documents(written_ids)
+        
+        if not total_chunks:
+            print("⚠️ No documents found to process")
+            return {"documents_processed": 0, "chunks_created": 0}
             
         stats = {
-            "documents_processed": len(set(doc['source'] for doc in documents)),
+            "documents_processed": len(sources),
             "chunks_created": total_chunks,
+            "duplicate_chunks_skipped": duplicate_chunks,
+            "stale_chunks_deleted": stale_chunks,
             "vector_store_count": self.collection.count()
         }
         
         print(f"✅ Vector store populated: {stats}")
         return stats
         
-    async def _add_document_batch(self, documents: List[Dict[str, Any]]):
-        """Add a batch of documents to the vector store"""
+    def _record_duplicate_sources(self, duplicate_sources: Dict[str, List[str]]):
+        """Store the sources of skipped duplicate chunks on the chunk that was kept"""
+        duplicate_sources = {doc_id: sources for doc_id, sources in duplicate_sources.items() if sources}
+        if not duplicate_sources:
+            return
+            
+        stored = self.collection.get(ids=list(duplicate_sources), include=['metadatas'])
+        metadatas = [
+            # Chroma metadata values must be scalars, so the source list is stored as JSON
+            {**meta, 'duplicate_sources': json.dumps(duplicate_sources[doc_id])}
+            for doc_id, meta in zip(stored['ids'], stored['metadatas'])
+        ]
+        self.collection.update(ids=stored['ids'], metadatas=metadatas)
+        
+    def _delete_stale_static_documents(self, keep_ids: set) -> int:
+        """Delete static (directory-ingested) chunks whose ids are not in keep_ids"""
+        existing = self.collection.get(where={"source_type": "static"}, include=[])
+        stale_ids = [doc_id for doc_id in existing['ids'] if doc_id not in keep_ids]
+        
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+            print(f"🗑️ Deleted {len(stale_ids)} stale chunks from the vector store")
+            
+        return len(stale_ids)
+        
+    @staticmethod
+    def _document_id(doc: Dict[str, Any]) -> str:
+        """Vector store id of a document chunk"""
+        return f"{doc['source']}_{doc['chunk_id']}"
+        
+    async def _encode(self, contents: List[str]):
+        """Encode texts in a worker thread with batched output"""
+        return await asyncio.to_thread(
+            self.encoder.encode,
+            contents,
+            batch_size=64,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        
+    async def _add_document_batch(self, documents: List[Dict[str, Any]], embeddings=None):
+        """Add a batch of documents to the vector store, encoding them unless embeddings are given"""
         if not documents:
             return
             
@@ -120,14 +271,12 @@ class VectorService:
             return
             
         try:
-            # Generate embeddings
             contents = [doc['content'] for doc in documents]
-            embeddings = await asyncio.to_thread(
-                self.encoder.encode, contents
-            )
+            if embeddings is None:
+                embeddings = await self._encode(contents)
             
             # Prepare data for Chroma
-            ids = [f"{doc['source']}_{doc['chunk_id']}" for doc in documents]
+            ids = [self._document_id(doc) for doc in documents]
             metadatas = [
                 {
                     'source': doc['source'],
@@ -141,8 +290,9 @@ class VectorService:
                 for doc in documents
             ]
             
-            # Add to collection
-            self.collection.add(
+            # Upsert so re-ingesting the same sources overwrites their chunks in place.
+            # chromadb 0.4.x only accepts embeddings as nested lists, hence the single tolist().
+            self.collection.upsert(
                 embeddings=embeddings.tolist(),
                 documents=contents,
                 metadatas=metadatas,
@@ -185,27 +335,36 @@ class VectorService:
                 include=['documents', 'metadatas', 'distances']
             )
             
-            # Format results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for doc, meta, dist in zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                ):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': meta,
-                        'distance': dist,
-                        'similarity': 1.0 - dist  # Convert distance to similarity
-                    })
-                    
-            return formatted_results
+            return self._format_results(results)
             
         except Exception as e:
             print(f"❌ Vector search error: {e}")
             return []
             
+    def _format_results(self, results: Dict[str, Any], **extra) -> List[Dict[str, Any]]:
+        """Turn a single-query Chroma result into result dicts, adding any extra fields to each"""
+        if not results['documents'] or not results['documents'][0]:
+            return []
+            
+        distances = np.asarray(results['distances'][0], dtype=np.float64)
+        similarities = 1.0 - distances  # Convert distance to similarity
+        
+        return [
+            {
+                'content': doc,
+                'metadata': meta,
+                'distance': dist,
+                'similarity': sim,
+                **extra
+            }
+            for doc, meta, dist, sim in zip(
+                results['documents'][0],
+                results['metadatas'][0],
+                distances.tolist(),
+                similarities.tolist()
+            )
+        ]
+        
     def get_collection_info(self) -> Dict[str, Any]:
         """Get information about the vector collection"""
         if not self.collection:
@@ -244,27 +403,12 @@ class VectorService:
             # Search with capability filter
             results = self.collection.query(
                 query_embeddings=query_embedding.tolist(),
-                n_results=n_results * 2,  # Get more results to filter
+                n_results=n_results,
                 where={"capability": capability},
                 include=['documents', 'metadatas', 'distances']
             )
             
-            # Format and limit results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for doc, meta, dist in zip(
-                    results['documents'][0][:n_results],
-                    results['metadatas'][0][:n_results],
-                    results['distances'][0][:n_results]
-                ):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': meta,
-                        'distance': dist,
-                        'similarity': 1.0 - dist
-                    })
-                    
-            return formatted_results
+            return self._format_results(results)
             
         except Exception as e:
             print(f"❌ Capability search error: {e}")
@@ -392,28 +536,12 @@ class VectorService:
             # Search in collection with dynamic content filter
             results = self.collection.query(
                 query_embeddings=query_embedding.tolist(),
-                n_results=n_results * 2,  # Get more to filter
+                n_results=n_results,
                 where=where_clause,
                 include=['documents', 'metadatas', 'distances']
             )
             
-            # Format results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for doc, meta, dist in zip(
-                    results['documents'][0][:n_results],
-                    results['metadatas'][0][:n_results],
-                    results['distances'][0][:n_results]
-                ):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': meta,
-                        'distance': dist,
-                        'similarity': 1.0 - dist,
-                        'is_dynamic': True
-                    })
-                    
-            return formatted_results
+            return self._format_results(results, is_dynamic=True)
             
         except Exception as e:
             print(f"❌ Dynamic content search error: {e}")
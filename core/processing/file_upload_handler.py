@@ -3,9 +3,16 @@ File Upload Handler for processing various file types.
 Supports PDF, DOCX, TXT, and Markdown files with text extraction.
 """
 
+import asyncio
 import io
 import logging
-from typing import List, Dict, Any, Optional
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Union
 from pathlib import Path
 import mimetypes
 
@@ -29,40 +36,109 @@ try:
 except ImportError:
     DOCX_AVAILABLE = False
 
+try:
+    from charset_normalizer import from_bytes
+    CHARSET_NORMALIZER_AVAILABLE = True
+except ImportError:
+    CHARSET_NORMALIZER_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Raw file content; any bytes-like buffer, so large uploads need not be copied into bytes
+FileContent = Union[bytes, bytearray, memoryview]
+
+# Markdown syntax stripped in a single pass; each alternative names the part to keep
+_MARKDOWN_SYNTAX = re.compile(
+    r'(?P<fence>```[^`]*```)'                # code blocks (dropped)
+    r'|`(?P<inline>[^`]+)`'                  # inline code
+    r'|\[(?P<link>[^\]]+)\]\([^\)]+\)'        # links
+    r'|\*\*(?P<bold>[^\*]+)\*\*'             # bold
+    r'|\*(?P<italic>[^\*]+)\*'               # italic
+    r'|(?P<header>^#{1,6}\s+)',              # headers (dropped)
+    re.MULTILINE
+)
+
+# Characters that can start markup inside a link label or emphasis span
+_NESTED_MARKUP = re.compile(r'[`\[*]')
+
+# Charset detection on large uploads only looks at this many leading bytes
+_DETECTION_SAMPLE_SIZE = 64 * 1024
+
+# Read size used when validating streamed uploads
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Worker pool for decoding and text extraction, kept off the event loop
+_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Extensions rejected outright, regardless of the declared content type
+_SUSPICIOUS_EXTS: frozenset = frozenset({'.exe', '.bat', '.cmd', '.scr', '.vbs', '.js', '.jar'})
+
+
+def _is_ascii(file_content: FileContent) -> bool:
+    """True if the content is pure ASCII; memoryviews are not checked."""
+    return not isinstance(file_content, memoryview) and file_content.isascii()
+
+
+@lru_cache(maxsize=512)
+def _guess_type_for_extension(file_ext: str) -> Optional[str]:
+    """MIME type guessed from a file extension; cached since few distinct extensions occur."""
+    return mimetypes.guess_type(f"file{file_ext}")[0]
+
+
+def _strip_markdown_syntax(match: re.Match) -> str:
+    """Replacement callback for _MARKDOWN_SYNTAX."""
+    kind = match.lastgroup
+    if kind in ('fence', 'header'):
+        return ''
+    text = match.group(kind)
+    if kind == 'inline' or not _NESTED_MARKUP.search(text):
+        return text
+    # Links and emphasis may wrap further markup
+    return _MARKDOWN_SYNTAX.sub(_strip_markdown_syntax, text)
+
+
+@dataclass(slots=True)
+class ProcessedDoc:
+    """Text extracted from one uploaded file."""
+    content: str
+    source: str
+    source_type: str
+    content_type: str
+    file_extension: str
+    metadata: Dict[str, Any]
+
 
 class FileUploadHandler:
     """
     Handler for processing uploaded files and extracting text content.
     """
     
-    SUPPORTED_TYPES = {
-        'text/plain': 'txt',
-        'text/markdown': 'md',
-        'application/pdf': 'pdf',
-        'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx'
+    # Content type -> (file extension, processor method name)
+    DISPATCH = {
+        'text/plain': ('txt', '_extract_text'),
+        'text/markdown': ('md', '_extract_markdown'),
+        'application/pdf': ('pdf', '_extract_pdf' if PDF_AVAILABLE else None),
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document': (
+            'docx', '_extract_docx' if DOCX_AVAILABLE else None
+        )
     }
+    SUPPORTED_TYPES = {content_type: ext for content_type, (ext, _) in DISPATCH.items()}
+    SUPPORTED_CONTENT_TYPES = frozenset(DISPATCH)
+    
+    # Processor method names by file extension, for files sent without a known content type
+    PROCESSORS = dict(DISPATCH.values())
+    
+    max_file_size = 10 * 1024 * 1024  # 10MB
+    max_files_per_batch = 10
     
     def __init__(self):
-        self.max_file_size = 10 * 1024 * 1024  # 10MB
-        self.max_files_per_batch = 10
-        
-        # Initialize processors
-        self.processors = {
-            'txt': self._process_text_file,
-            'md': self._process_markdown_file,
-            'pdf': self._process_pdf_file if PDF_AVAILABLE else None,
-            'docx': self._process_docx_file if DOCX_AVAILABLE else None
-        }
-        
         logger.info("📁 FileUploadHandler initialized")
         if not PDF_AVAILABLE:
             logger.warning("⚠️ PDF processing not available - install PyPDF2 or pdfplumber")
         if not DOCX_AVAILABLE:
             logger.warning("⚠️ DOCX processing not available - install python-docx")
     
-    async def process_uploaded_files(self, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def process_uploaded_files(self, files: List[Dict[str, Any]]) -> List[ProcessedDoc]:
         """
         Process multiple uploaded files and extract text content.
         
@@ -72,31 +148,35 @@ class FileUploadHandler:
         Returns:
             List of processed documents with extracted text
         """
-        processed_documents = []
-        
         if len(files) > self.max_files_per_batch:
             raise ValueError(f"Too many files. Maximum {self.max_files_per_batch} files allowed per batch")
         
-        for file_data in files:
-            try:
-                processed_doc = await self._process_single_file(file_data)
-                if processed_doc:
-                    processed_documents.append(processed_doc)
-                    logger.info(f"✅ Processed file: {file_data.get('filename', 'unknown')}")
-                else:
-                    logger.warning(f"⚠️ Failed to process file: {file_data.get('filename', 'unknown')}")
-                    
-            except Exception as e:
-                logger.error(f"❌ Error processing file {file_data.get('filename', 'unknown')}: {e}")
-                continue
+        # Concurrency is bounded by the _POOL worker count; extra files queue in the pool
+        results = await asyncio.gather(*(self._process_single_file(f) for f in files), return_exceptions=True)
+        
+        processed_documents = []
+        for file_data, result in zip(files, results):
+            filename = file_data.get('filename', 'unknown')
+            if isinstance(result, Exception):
+                logger.error(f"❌ Error processing file {filename}: {result}")
+            elif result:
+                processed_documents.append(result)
+                logger.info(f"✅ Processed file: {filename}")
+            else:
+                logger.warning(f"⚠️ Failed to process file: {filename}")
         
         logger.info(f"📊 Processed {len(processed_documents)} out of {len(files)} files")
         return processed_documents
     
-    async def _process_single_file(self, file_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def _process_single_file(self, file_data: Dict[str, Any]) -> Optional[ProcessedDoc]:
+        """Process a single uploaded file in the worker pool."""
+        return await self._run_in_pool(self._process_single_file_sync, file_data)
+    
+    def _process_single_file_sync(self, file_data: Dict[str, Any]) -> Optional[ProcessedDoc]:
         """Process a single uploaded file."""
         filename = file_data.get('filename', 'unknown')
-        content_type = file_data.get('content_type', '')
+        # Content types repeat across uploads; keep one shared string per distinct value
+        content_type = sys.intern(file_data.get('content_type', ''))
         file_content_raw = file_data.get('content', '')
         
         # Handle base64 encoded content from frontend
@@ -110,36 +190,38 @@ class FileUploadHandler:
             file_content = file_content_raw
         
         # Validate file
-        validation_result = await self.validate_file(file_data)
+        validation_result = self._validate_file_sync(file_data)
         if not validation_result['valid']:
             raise ValueError(f"File validation failed: {', '.join(validation_result['errors'])}")
         
-        # Determine file type
-        file_extension = self.SUPPORTED_TYPES.get(content_type)
-        if not file_extension:
+        # Determine file type and processor
+        dispatch = self.DISPATCH.get(content_type)
+        if dispatch:
+            file_extension, processor_name = dispatch
+        else:
             # Try to determine from filename
-            file_extension = Path(filename).suffix.lower().lstrip('.')
-            if file_extension not in self.processors:
+            file_extension = sys.intern(Path(filename).suffix.lower().lstrip('.'))
+            if file_extension not in self.PROCESSORS:
                 raise ValueError(f"Unsupported file type: {content_type}")
+            processor_name = self.PROCESSORS[file_extension]
         
         # Extract text content
-        processor = self.processors.get(file_extension)
-        if not processor:
+        if not processor_name:
             raise ValueError(f"No processor available for {file_extension} files")
         
-        extracted_text = await processor(file_content, filename)
+        extracted_text = getattr(self, processor_name)(file_content, filename)
         
         if not extracted_text or len(extracted_text.strip()) < 10:
             raise ValueError("Extracted text is too short or empty")
         
         # Create processed document
-        processed_doc = {
-            'content': extracted_text,
-            'source': filename,
-            'source_type': 'upload',
-            'content_type': content_type,
-            'file_extension': file_extension,
-            'metadata': {
+        processed_doc = ProcessedDoc(
+            content=extracted_text,
+            source=filename,
+            source_type='upload',
+            content_type=content_type,
+            file_extension=file_extension,
+            metadata={
                 'original_filename': filename,
                 'file_size': len(file_content),
                 'content_type': content_type,
@@ -147,22 +229,27 @@ class FileUploadHandler:
                 'character_count': len(extracted_text),
                 'word_count': len(extracted_text.split())
             }
-        }
+        )
         
         return processed_doc
     
-    async def validate_file(self, file_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def validate_file(self, file_data: Dict[str, Any], strict: bool = False) -> Dict[str, Any]:
         """
         Validate uploaded file for security and format compliance.
         
+        Checks run cheapest first and stop at the first error.
+        
         Args:
             file_data: File data dictionary
+            strict: Run every check and report all errors instead of stopping at the first
             
         Returns:
             Validation result with 'valid', 'errors', 'warnings'
         """
-        result = {'valid': True, 'errors': [], 'warnings': []}
-        
+        return await self._run_in_pool(self._validate_file_sync, file_data, strict)
+    
+    def _validate_file_sync(self, file_data: Dict[str, Any], strict: bool = False) -> Dict[str, Any]:
+        """Validate uploaded file; see validate_file."""
         filename = file_data.get('filename', '')
         content_type = file_data.get('content_type', '')
         file_content_raw = file_data.get('content', '')
@@ -177,94 +264,187 @@ class FileUploadHandler:
         else:
             file_content = file_content_raw
         
-        # Check file size
-        file_size = len(file_content)
-        if file_size == 0:
-            result['valid'] = False
-            result['errors'].append("File is empty")
-        elif file_size > self.max_file_size:
+        result = self.validate_file_metadata(
+            filename=filename, content_type=content_type, size=len(file_content), strict=strict
+        )
+        if not result['valid'] and not strict:
+            return result
+        
+        # Basic content validation
+        if file_content:
+            # Check for binary content in text files
+            if content_type.startswith('text/') and not _is_ascii(file_content):
+                try:
+                    str(file_content, 'utf-8')
+                except UnicodeDecodeError:
+                    result['warnings'].append("File may contain binary data")
+        
+        return result
+    
+    def validate_file_metadata(self, *, filename: str, content_type: str,
+                               size: Optional[int], strict: bool = False) -> Dict[str, Any]:
+        """
+        Validate an upload from its metadata alone, before the body is read.
+        
+        Args:
+            filename: Original filename
+            content_type: Declared MIME type
+            size: File size in bytes (e.g. Content-Length); None skips the size checks
+            strict: Run every check and report all errors instead of stopping at the first
+            
+        Returns:
+            Validation result with 'valid', 'errors', 'warnings'
+        """
+        result = {'valid': True, 'errors': [], 'warnings': []}
+        
+        def reject(message: str) -> bool:
+            """Record an error; True if validation should stop here."""
             result['valid'] = False
-            result['errors'].append(f"File size ({file_size} bytes) exceeds maximum ({self.max_file_size} bytes)")
+            result['errors'].append(message)
+            return not strict
+        
+        # Check file size
+        if size == 0:
+            if reject("File is empty"):
+                return result
+        elif size is not None and size > self.max_file_size:
+            if reject(f"File size ({size} bytes) exceeds maximum ({self.max_file_size} bytes)"):
+                return result
         
         # Check filename
         if not filename:
-            result['valid'] = False
-            result['errors'].append("Filename is required")
+            if reject("Filename is required"):
+                return result
         elif len(filename) > 255:
-            result['valid'] = False
-            result['errors'].append("Filename is too long")
+            if reject("Filename is too long"):
+                return result
         
         # Check for suspicious file extensions
-        suspicious_extensions = ['.exe', '.bat', '.cmd', '.scr', '.vbs', '.js', '.jar']
-        file_ext = Path(filename).suffix.lower()
-        if file_ext in suspicious_extensions:
-            result['valid'] = False
-            result['errors'].append(f"Potentially unsafe file extension: {file_ext}")
+        file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext in _SUSPICIOUS_EXTS:
+            if reject(f"Potentially unsafe file extension: {file_ext}"):
+                return result
         
         # Validate content type
-        if content_type not in self.SUPPORTED_TYPES:
+        if content_type not in self.SUPPORTED_CONTENT_TYPES:
             # Try to guess from filename
-            guessed_type, _ = mimetypes.guess_type(filename)
-            if guessed_type and guessed_type in self.SUPPORTED_TYPES:
+            guessed_type = _guess_type_for_extension(file_ext)
+            if guessed_type in self.SUPPORTED_CONTENT_TYPES:
                 result['warnings'].append(f"Content type mismatch. Using guessed type: {guessed_type}")
-            else:
-                result['valid'] = False
-                result['errors'].append(f"Unsupported content type: {content_type}")
-        
-        # Basic content validation
-        if file_content:
-            # Check for binary content in text files
-            if content_type.startswith('text/'):
-                try:
-                    file_content.decode('utf-8')
-                except UnicodeDecodeError:
-                    result['warnings'].append("File may contain binary data")
+            elif reject(f"Unsupported content type: {content_type}"):
+                return result
         
         return result
     
-    async def _process_text_file(self, file_content: bytes, filename: str) -> str:
-        """Process plain text files."""
-        try:
-            # Try different encodings
-            encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252']
+    async def validate_file_stream(self, filename: str, content_type: str,
+                                   size_hint: Optional[int], reader) -> Tuple[Dict[str, Any], Optional[bytearray]]:
+        """
+        Validate an upload while reading it, rejecting invalid or oversized files before they are buffered.
+        
+        Args:
+            filename: Original filename
+            content_type: Declared MIME type
+            size_hint: Declared size (e.g. Content-Length), if known
+            reader: Object with an async read(size) method, or an async iterator of byte chunks
             
-            for encoding in encodings:
+        Returns:
+            Validation result and the file content (None if rejected before fully read)
+        """
+        # Size, name and type are checked before any of the body is read
+        precheck = self.validate_file_metadata(filename=filename, content_type=content_type, size=size_hint)
+        if not precheck['valid']:
+            return precheck, None
+        
+        buffer = bytearray()
+        async for chunk in self._iter_stream(reader):
+            buffer += chunk
+            if len(buffer) > self.max_file_size:
+                return self._size_limit_error(len(buffer)), None
+        
+        # Hand out the read buffer itself rather than copying it into bytes
+        result = await self.validate_file({
+            'filename': filename,
+            'content_type': content_type,
+            'content': buffer
+        })
+        return result, buffer
+    
+    @staticmethod
+    async def _iter_stream(reader):
+        """Yield byte chunks from an UploadFile-like reader or an async iterator."""
+        if hasattr(reader, 'read'):
+            while True:
+                chunk = await reader.read(_STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            async for chunk in reader:
+                yield chunk
+    
+    def _size_limit_error(self, file_size: int) -> Dict[str, Any]:
+        """Validation result for a file over the size limit."""
+        return {
+            'valid': False,
+            'errors': [f"File size ({file_size} bytes) exceeds maximum ({self.max_file_size} bytes)"],
+            'warnings': []
+        }
+    
+    @staticmethod
+    async def _run_in_pool(func, *args):
+        """Run a blocking function in the worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(_POOL, func, *args)
+    
+    def _extract_text(self, file_content: FileContent, filename: str) -> str:
+        """Extract text from plain text files."""
+        try:
+            # Fast paths: pure ASCII, then UTF-8 (with or without BOM), need no detection
+            if _is_ascii(file_content):
+                text = str(file_content, 'ascii')
+            else:
                 try:
-                    text = file_content.decode(encoding)
-                    # Clean up the text
-                    text = text.replace('\r\n', '\n').replace('\r', '\n')
-                    return text.strip()
+                    text = str(file_content, 'utf-8-sig')
                 except UnicodeDecodeError:
-                    continue
+                    text = self._decode_with_detection(file_content)
             
-            raise ValueError("Could not decode text file with any supported encoding")
+            # Clean up the text (including stray BOMs left by re-encoded files)
+            text = text.lstrip('\ufeff').replace('\r\n', '\n').replace('\r', '\n')
+            return text.strip()
             
         except Exception as e:
             logger.error(f"❌ Text file processing error: {e}")
             raise
     
-    async def _process_markdown_file(self, file_content: bytes, filename: str) -> str:
-        """Process Markdown files."""
+    def _decode_with_detection(self, file_content: FileContent) -> str:
+        """Decode non-UTF-8 text, detecting the charset when charset-normalizer is installed."""
+        if CHARSET_NORMALIZER_AVAILABLE:
+            # Detect on a bounded sample, then decode the full buffer in one shot
+            sample = memoryview(file_content)[:_DETECTION_SAMPLE_SIZE]
+            best = from_bytes(bytes(sample)).best()
+            # Without any language coherence the guess is arbitrary on short inputs
+            # (Latin-1 'Café' comes back as cp1006), so fall through to Western codecs
+            if best is not None and best.coherence > 0:
+                try:
+                    return str(file_content, best.encoding)
+                except (UnicodeDecodeError, LookupError):
+                    pass
+        
+        for encoding in ('latin-1', 'cp1252'):
+            try:
+                return str(file_content, encoding)
+            except UnicodeDecodeError:
+                continue
+        
+        raise ValueError("Could not decode text file with any supported encoding")
+    
+    def _extract_markdown(self, file_content: FileContent, filename: str) -> str:
+        """Extract text from Markdown files."""
         try:
             # Markdown files are essentially text files
-            text = await self._process_text_file(file_content, filename)
+            text = self._extract_text(file_content, filename)
             
             # Basic markdown cleanup - remove some markdown syntax for better text extraction
-            import re
-            
-            # Remove markdown headers but keep the text
-            text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-            
-            # Remove markdown links but keep the text
-            text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-            
-            # Remove markdown emphasis but keep the text
-            text = re.sub(r'\*\*([^\*]+)\*\*', r'\1', text)
-            text = re.sub(r'\*([^\*]+)\*', r'\1', text)
-            
-            # Remove code blocks
-            text = re.sub(r'```[^`]*```', '', text, flags=re.DOTALL)
-            text = re.sub(r'`([^`]+)`', r'\1', text)
+            text = _MARKDOWN_SYNTAX.sub(_strip_markdown_syntax, text)
             
             return text.strip()
             
@@ -272,8 +452,8 @@ class FileUploadHandler:
             logger.error(f"❌ Markdown file processing error: {e}")
             raise
     
-    async def _process_pdf_file(self, file_content: bytes, filename: str) -> str:
-        """Process PDF files."""
+    def _extract_pdf(self, file_content: FileContent, filename: str) -> str:
+        """Extract text from PDF files."""
         if not PDF_AVAILABLE:
             raise ValueError("PDF processing not available. Install PyPDF2 or pdfplumber")
         
@@ -306,7 +486,6 @@ class FileUploadHandler:
             full_text = '\n\n'.join(text_content)
             
             # Clean up common PDF artifacts
-            import re
             full_text = re.sub(r'\s+', ' ', full_text)  # Normalize whitespace
             full_text = re.sub(r'\n\s*\n', '\n\n', full_text)  # Clean up line breaks
             
@@ -316,8 +495,8 @@ class FileUploadHandler:
             logger.error(f"❌ PDF processing error: {e}")
             raise
     
-    async def _process_docx_file(self, file_content: bytes, filename: str) -> str:
-        """Process DOCX files."""
+    def _extract_docx(self, file_content: FileContent, filename: str) -> str:
+        """Extract text from DOCX files."""
         if not DOCX_AVAILABLE:
             raise ValueError("DOCX processing not available. Install python-docx")
         
@@ -373,7 +552,18 @@ class FileUploadHandler:
             'filename': filename,
             'content_type': content_type,
             'file_size': len(file_content),
-            'file_extension': Path(filename).suffix.lower(),
-            'supported': content_type in self.SUPPORTED_TYPES,
-            'processor_available': self.processors.get(self.SUPPORTED_TYPES.get(content_type)) is not None
-        }
\ No newline at end of file
+            'file_extension': os.path.splitext(filename)[1].lower(),
+            'supported': content_type in self.SUPPORTED_CONTENT_TYPES,
+            'processor_available': self.DISPATCH.get(content_type, (None, None))[1] is not None
+        }
+
+
+_file_upload_handler: Optional[FileUploadHandler] = None
+
+
+def get_file_upload_handler() -> FileUploadHandler:
+    """Get the process-wide FileUploadHandler instance."""
+    global _file_upload_handler
+    if _file_upload_handler is None:
+        _file_upload_handler = FileUploadHandler()
+    return _file_upload_handler
\ No newline at end of file
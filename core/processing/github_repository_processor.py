@@ -7,13 +7,114 @@ import asyncio
 import aiohttp
 import logging
 import base64
-from typing import Dict, List, Any, Optional
+import heapq
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
 from urllib.parse import urlparse
 from datetime import datetime
 import re
 
 logger = logging.getLogger(__name__)
 
+# Extensions treated as source code (prefixed with a path header when decoded)
+_CODE_EXTENSIONS = frozenset({
+    '.py', '.js', '.ts', '.java', '.cpp', '.c', '.h', '.hpp', '.go', '.rs', '.php', '.rb'
+})
+
+# Byte-order marks and the encodings they identify
+_BOM_ENCODINGS = (
+    (b'\xef\xbb\xbf', 'utf-8'),
+    (b'\xff\xfe', 'utf-16-le'),
+    (b'\xfe\xff', 'utf-16-be'),
+)
+
+# Path keywords used to rank documentation files
+_DOC_WORDS_RE = re.compile(r'doc|guide|tutorial')
+_API_WORDS_RE = re.compile(r'api|spec|schema')
+_CONFIG_SUFFIXES = ('.json', '.yml', '.yaml', '.toml')
+
+
+@lru_cache(maxsize=4096)
+def _file_extension(file_path: str) -> str:
+    """Lowercased text after the last '.' of a repository path, or '' if it has none."""
+    return '.' + file_path.split('.')[-1].lower() if '.' in file_path else ''
+
+
+@lru_cache(maxsize=4096)
+def _file_priority_score(file_path: str) -> int:
+    """Priority score for a repository path (lower is higher priority)."""
+    file_path_lower = file_path.lower()
+    
+    # README files have highest priority
+    if 'readme' in file_path_lower:
+        return 0
+    
+    # Documentation files
+    if _DOC_WORDS_RE.search(file_path_lower):
+        return 1
+    
+    # API/specification files
+    if _API_WORDS_RE.search(file_path_lower):
+        return 2
+    
+    # Configuration files
+    if file_path_lower.endswith(_CONFIG_SUFFIXES):
+        return 3
+    
+    # Source code files
+    return 4
+
+
+def _header_number(headers: Any, name: str) -> Optional[float]:
+    """Read a numeric response header, or None when it is absent or malformed."""
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class _RateLimiter:
+    """
+    Holds back GitHub requests while the API rate limit is exhausted.
+    
+    Every response is fed to update(); a 403/429 with Retry-After, or a
+    remaining quota below min_remaining, closes the gate until the advertised
+    reset time (capped at max_wait) and acquire() waits for it to reopen.
+    """
+    
+    def __init__(self, min_remaining: int = 5, max_wait: float = 60.0):
+        self.min_remaining = min_remaining
+        self.max_wait = max_wait
+        self._open = asyncio.Event()
+        self._open.set()
+    
+    async def acquire(self):
+        """Wait until requests are allowed."""
+        await self._open.wait()
+    
+    def update(self, status: int, headers: Any) -> float:
+        """Record a response's rate-limit headers; returns the pause it imposed in seconds."""
+        retry_after = _header_number(headers, 'Retry-After')
+        remaining = _header_number(headers, 'X-RateLimit-Remaining')
+        reset_at = _header_number(headers, 'X-RateLimit-Reset')
+        
+        if status in (403, 429) and retry_after is not None:
+            delay = retry_after
+        elif remaining is not None and remaining < self.min_remaining and reset_at is not None:
+            delay = reset_at - time.time()
+        else:
+            return 0.0
+        
+        delay = min(max(delay, 0.0), self.max_wait)
+        if delay > 0 and self._open.is_set():
+            logger.warning(f"⏳ GitHub rate limit reached, pausing requests for {delay:.1f}s")
+            self._open.clear()
+            asyncio.get_running_loop().call_later(delay, self._open.set)
+        return delay
+
 
 class GitHubRepositoryProcessor:
     """
@@ -23,6 +124,13 @@ class GitHubRepositoryProcessor:
     def __init__(self, github_token: Optional[str] = None):
         self.github_token = github_token
         self.session = None
+        self._connector = None
+        self._dir_semaphore = None
+        self.max_concurrent_listings = 8
+        self._file_semaphore = None
+        self.max_concurrent_downloads = 16
+        self._rate_limiter = _RateLimiter()
+        self.max_rate_limit_retries = 1
         self.timeout = aiohttp.ClientTimeout(total=60)
         
         # GitHub API settings
@@ -30,6 +138,10 @@ class GitHubRepositoryProcessor:
         self.max_file_size = 1024 * 1024  # 1MB per file
         self.max_files_per_repo = 50
         
+        # API responses by URL as (ETag, payload); 304 revalidations are free on rate limits
+        self._etag_cache: Dict[str, Tuple[str, Any]] = {}
+        self.max_etag_cache_entries = 1024
+        
         # Supported file extensions for documentation
         self.supported_extensions = {
             '.md', '.txt', '.rst', '.py', '.js', '.ts', '.json', '.yml', '.yaml',
@@ -65,7 +177,17 @@ class GitHubRepositoryProcessor:
         if self.github_token:
             headers['Authorization'] = f'token {self.github_token}'
         
+        # Keep-alive pool so the many API and download requests reuse connections
+        self._connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=64,
+            keepalive_timeout=75,
+            ttl_dns_cache=300
+        )
+        self._dir_semaphore = asyncio.Semaphore(self.max_concurrent_listings)
+        self._file_semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
         self.session = aiohttp.ClientSession(
+            connector=self._connector,
             timeout=self.timeout,
             headers=headers
         )
@@ -150,27 +272,25 @@ class GitHubRepositoryProcessor:
         try:
             url = f"{self.api_base_url}/repos/{owner}/{repo}"
             
-            async with self.session.get(url) as response:
-                if response.status == 404:
-                    raise ValueError(f"Repository {owner}/{repo} not found or not accessible")
-                elif response.status == 403:
-                    raise ValueError("API rate limit exceeded or repository is private")
-                elif response.status != 200:
-                    raise ValueError(f"GitHub API error: {response.status}")
-                
-                repo_info = await response.json()
-                
-                return {
-                    'name': repo_info.get('name', repo),
-                    'full_name': repo_info.get('full_name', f'{owner}/{repo}'),
-                    'description': repo_info.get('description', ''),
-                    'language': repo_info.get('language', ''),
-                    'stars': repo_info.get('stargazers_count', 0),
-                    'forks': repo_info.get('forks_count', 0),
-                    'updated_at': repo_info.get('updated_at', ''),
-                    'default_branch': repo_info.get('default_branch', 'main'),
-                    'topics': repo_info.get('topics', [])
-                }
+            status, repo_info = await self._get_api_json(url)
+            if status == 404:
+                raise ValueError(f"Repository {owner}/{repo} not found or not accessible")
+            elif status == 403:
+                raise ValueError("API rate limit exceeded or repository is private")
+            elif status != 200:
+                raise ValueError(f"GitHub API error: {status}")
+            
+            return {
+                'name': repo_info.get('name', repo),
+                'full_name': repo_info.get('full_name', f'{owner}/{repo}'),
+                'description': repo_info.get('description', ''),
+                'language': repo_info.get('language', ''),
+                'stars': repo_info.get('stargazers_count', 0),
+                'forks': repo_info.get('forks_count', 0),
+                'updated_at': repo_info.get('updated_at', ''),
+                'default_branch': repo_info.get('default_branch', 'main'),
+                'topics': repo_info.get('topics', [])
+            }
                 
         except aiohttp.ClientError as e:
             raise ValueError(f"Network error accessing repository: {str(e)}")
@@ -180,163 +300,188 @@ class GitHubRepositoryProcessor:
         try:
             url = f"{self.api_base_url}/repos/{owner}/{repo}/contents/{path}"
             
-            async with self.session.get(url) as response:
-                if response.status != 200:
-                    logger.warning(f"⚠️ Could not access path {path}: {response.status}")
-                    return []
-                
-                contents = await response.json()
-                
-                # Handle single file response
-                if isinstance(contents, dict):
-                    contents = [contents]
-                
-                all_files = []
-                
-                for item in contents:
-                    if item['type'] == 'file':
-                        # Check file extension
-                        file_path = item['path']
-                        file_ext = '.' + file_path.split('.')[-1].lower() if '.' in file_path else ''
-                        
-                        if file_ext in self.supported_extensions:
-                            all_files.append(item)
-                    
-                    elif item['type'] == 'dir':
-                        # Skip certain directories
-                        dir_name = item['name'].lower()
-                        if dir_name not in self.skip_dirs:
-                            # Recursively get directory contents
-                            subdir_files = await self._get_repository_contents(
-                                owner, repo, item['path']
-                            )
-                            all_files.extend(subdir_files)
-                
-                return all_files
+            # Only the request is bounded; holding the semaphore while recursing could deadlock
+            async with self._dir_semaphore:
+                status, contents = await self._get_api_json(url)
+            if status != 200:
+                logger.warning(f"⚠️ Could not access path {path}: {status}")
+                return []
+            
+            # Handle single file response
+            if isinstance(contents, dict):
+                contents = [contents]
+            
+            all_files = []
+            subdirs = []
+            
+            for item in contents:
+                if item['type'] == 'file':
+                    # Check file extension
+                    if _file_extension(item['path']) in self.supported_extensions:
+                        all_files.append(item)
                 
+                elif item['type'] == 'dir':
+                    # Skip certain directories
+                    dir_name = item['name'].lower()
+                    if dir_name not in self.skip_dirs:
+                        subdirs.append(item['path'])
+            
+            # Recursively get directory contents, listing sibling directories concurrently
+            subdir_results = await asyncio.gather(
+                *(self._get_repository_contents(owner, repo, subdir) for subdir in subdirs)
+            )
+            for subdir_files in subdir_results:
+                all_files.extend(subdir_files)
+            
+            return all_files
+            
         except Exception as e:
             logger.warning(f"⚠️ Error getting contents for path {path}: {e}")
             return []
     
+    @asynccontextmanager
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """
+        session.get() gated by the rate limiter.
+        
+        Rate-limited responses carrying a wait hint are retried once the
+        limiter reopens, up to max_rate_limit_retries times.
+        """
+        for attempt in range(self.max_rate_limit_retries + 1):
+            await self._rate_limiter.acquire()
+            async with self.session.get(url, headers=headers) as response:
+                delay = self._rate_limiter.update(response.status, response.headers)
+                if response.status in (403, 429) and delay and attempt < self.max_rate_limit_retries:
+                    continue
+                yield response
+                return
+    
+    async def _get_api_json(self, url: str) -> Tuple[int, Any]:
+        """
+        GET a GitHub API URL, revalidating previously seen responses with their ETag.
+        
+        Returns:
+            HTTP status (200 for a cache hit) and the decoded JSON payload, or None on error
+        """
+        cached = self._etag_cache.get(url)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        
+        async with self._get(url, headers=headers) as response:
+            if response.status == 304 and cached:
+                return 200, cached[1]
+            if response.status != 200:
+                return response.status, None
+            
+            payload = await response.json()
+            etag = response.headers.get('ETag')
+            if etag:
+                if len(self._etag_cache) >= self.max_etag_cache_entries:
+                    # Evict the oldest entry
+                    self._etag_cache.pop(next(iter(self._etag_cache)))
+                self._etag_cache[url] = (etag, payload)
+            return 200, payload
+    
     def _filter_documentation_files(self, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Filter and prioritize documentation files."""
         if len(files) > self.max_files_per_repo:
             logger.warning(f"⚠️ Repository has {len(files)} files, limiting to {self.max_files_per_repo}")
         
-        # Separate priority files
+        # Separate priority files; a name match always implies a path suffix match
+        priority_suffixes = tuple(self.priority_files)
+        priority_prefixes = tuple(f'{priority_dir}/' for priority_dir in self.priority_dirs)
         priority_files = []
         regular_files = []
         
         for file_info in files:
             file_path = file_info['path'].lower()
-            file_name = file_info['name'].lower()
-            
-            # Check if it's a priority file
-            is_priority = False
-            
-            # Check priority file names
-            for priority_name in self.priority_files:
-                if file_name == priority_name or file_path.endswith(priority_name):
-                    is_priority = True
-                    break
-            
-            # Check priority directories
-            if not is_priority:
-                for priority_dir in self.priority_dirs:
-                    if file_path.startswith(f'{priority_dir}/'):
-                        is_priority = True
-                        break
-            
-            if is_priority:
+            if file_path.endswith(priority_suffixes) or file_path.startswith(priority_prefixes):
                 priority_files.append(file_info)
             else:
                 regular_files.append(file_info)
         
-        # Sort priority files by importance
-        priority_files.sort(key=lambda x: self._get_file_priority_score(x['path']))
+        # Select the most important priority files, scoring each distinct path once.
+        # nsmallest is stable like sorted(...)[:n] but only keeps n items in its heap.
+        limit = self.max_files_per_repo
+        scores = {
+            path: self._get_file_priority_score(path)
+            for path in {file_info['path'] for file_info in priority_files}
+        }
+        priority_files = heapq.nsmallest(limit, priority_files, key=lambda x: scores[x['path']])
         
-        # Sort regular files by path
-        regular_files.sort(key=lambda x: x['path'])
+        # Fill the remaining slots with regular files by path
+        regular_files = heapq.nsmallest(
+            limit - len(priority_files), regular_files, key=lambda x: x['path']
+        )
         
-        # Combine and limit
-        filtered_files = priority_files + regular_files
-        return filtered_files[:self.max_files_per_repo]
+        return priority_files + regular_files
     
     def _get_file_priority_score(self, file_path: str) -> int:
         """Get priority score for a file (lower is higher priority)."""
-        file_path_lower = file_path.lower()
-        
-        # README files have highest priority
-        if 'readme' in file_path_lower:
-            return 0
-        
-        # Documentation files
-        if any(doc_word in file_path_lower for doc_word in ['doc', 'guide', 'tutorial']):
-            return 1
-        
-        # API/specification files
-        if any(api_word in file_path_lower for api_word in ['api', 'spec', 'schema']):
-            return 2
-        
-        # Configuration files
-        if file_path_lower.endswith(('.json', '.yml', '.yaml', '.toml')):
-            return 3
-        
-        # Source code files
-        return 4
+        return _file_priority_score(file_path)
     
     async def _process_repository_files(self, owner: str, repo: str, 
                                       files: List[Dict[str, Any]], 
                                       repo_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Process individual repository files."""
-        processed_docs = []
+        # One timestamp for the whole batch, shared by every file's metadata
+        extraction_timestamp = datetime.now().isoformat()
         
-        for file_info in files:
-            try:
-                # Check file size
-                if file_info.get('size', 0) > self.max_file_size:
-                    logger.warning(f"⚠️ Skipping large file: {file_info['path']} ({file_info['size']} bytes)")
-                    continue
-                
-                # Get file content
+        # Download concurrently; gather keeps the results in file order
+        results = await asyncio.gather(*(
+            self._process_repository_file(owner, repo, file_info, repo_info, extraction_timestamp)
+            for file_info in files
+        ))
+        
+        return [doc for doc in results if doc is not None]
+    
+    async def _process_repository_file(self, owner: str, repo: str, file_info: Dict[str, Any],
+                                       repo_info: Dict[str, Any],
+                                       extraction_timestamp: str) -> Optional[Dict[str, Any]]:
+        """Download and wrap a single repository file."""
+        try:
+            # Check file size
+            if file_info.get('size', 0) > self.max_file_size:
+                logger.warning(f"⚠️ Skipping large file: {file_info['path']} ({file_info['size']} bytes)")
+                return None
+            
+            # Get file content
+            async with self._file_semaphore:
                 file_content = await self._get_file_content(owner, repo, file_info)
-                
-                if not file_content:
-                    continue
-                
-                # Create processed document
-                processed_doc = {
-                    'content': file_content,
-                    'source': f"{owner}/{repo}/{file_info['path']}",
-                    'source_type': 'github',
+            
+            if not file_content:
+                return None
+            
+            # Create processed document
+            processed_doc = {
+                'content': file_content,
+                'source': f"{owner}/{repo}/{file_info['path']}",
+                'source_type': 'github',
+                'file_path': file_info['path'],
+                'repository': f"{owner}/{repo}",
+                'metadata': {
+                    'repository_name': repo_info['name'],
+                    'repository_full_name': repo_info['full_name'],
+                    'repository_description': repo_info['description'],
+                    'repository_language': repo_info['language'],
+                    'repository_stars': repo_info['stars'],
                     'file_path': file_info['path'],
-                    'repository': f"{owner}/{repo}",
-                    'metadata': {
-                        'repository_name': repo_info['name'],
-                        'repository_full_name': repo_info['full_name'],
-                        'repository_description': repo_info['description'],
-                        'repository_language': repo_info['language'],
-                        'repository_stars': repo_info['stars'],
-                        'file_path': file_info['path'],
-                        'file_name': file_info['name'],
-                        'file_size': file_info.get('size', 0),
-                        'file_extension': self._get_file_extension(file_info['path']),
-                        'character_count': len(file_content),
-                        'word_count': len(file_content.split()),
-                        'extraction_timestamp': datetime.now().isoformat(),
-                        'github_url': file_info.get('html_url', ''),
-                        'repository_topics': repo_info.get('topics', [])
-                    }
+                    'file_name': file_info['name'],
+                    'file_size': file_info.get('size', 0),
+                    'file_extension': self._get_file_extension(file_info['path']),
+                    'character_count': len(file_content),
+                    'word_count': len(file_content.split()),
+                    'extraction_timestamp': extraction_timestamp,
+                    'github_url': file_info.get('html_url', ''),
+                    'repository_topics': repo_info.get('topics', [])
                 }
-                
-                processed_docs.append(processed_doc)
-                logger.info(f"📄 Processed file: {file_info['path']}")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Error processing file {file_info['path']}: {e}")
-                continue
-        
-        return processed_docs
+            }
+            
+            logger.info(f"📄 Processed file: {file_info['path']}")
+            return processed_doc
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Error processing file {file_info['path']}: {e}")
+            return None
     
     async def _get_file_content(self, owner: str, repo: str, file_info: Dict[str, Any]) -> Optional[str]:
         """Get content of a specific file."""
@@ -344,7 +489,7 @@ class GitHubRepositoryProcessor:
             # Use the download URL for raw content
             download_url = file_info.get('download_url')
             if download_url:
-                async with self.session.get(download_url) as response:
+                async with self._get(download_url) as response:
                     if response.status == 200:
                         content_bytes = await response.read()
                         return self._decode_file_content(content_bytes, file_info['path'])
@@ -352,7 +497,7 @@ class GitHubRepositoryProcessor:
             # Fallback to API content (base64 encoded)
             url = f"{self.api_base_url}/repos/{owner}/{repo}/contents/{file_info['path']}"
             
-            async with self.session.get(url) as response:
+            async with self._get(url) as response:
                 if response.status != 200:
                     return None
                 
@@ -370,37 +515,35 @@ class GitHubRepositoryProcessor:
     
     def _decode_file_content(self, content_bytes: bytes, file_path: str) -> str:
         """Decode file content from bytes to string."""
-        # Try different encodings
-        encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252']
-        
-        for encoding in encodings:
+        # A BOM names the encoding outright; otherwise try UTF-8 and fall back to
+        # latin-1, which maps every byte and so never fails
+        for bom, encoding in _BOM_ENCODINGS:
+            if content_bytes.startswith(bom):
+                content = content_bytes[len(bom):].decode(encoding, errors='replace')
+                break
+        else:
             try:
-                content = content_bytes.decode(encoding)
-                
-                # Clean up content
-                content = content.replace('\r\n', '\n').replace('\r', '\n')
-                
-                # For code files, add some context
-                if self._is_code_file(file_path):
-                    content = f"# File: {file_path}\n\n{content}"
-                
-                return content.strip()
-                
+                content = content_bytes.decode('utf-8')
             except UnicodeDecodeError:
-                continue
+                content = content_bytes.decode('latin-1')
+        
+        # Clean up content
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        
+        # For code files, add some context
+        if self._is_code_file(file_path):
+            content = f"# File: {file_path}\n\n{content}"
         
-        # If all encodings fail, use utf-8 with error handling
-        return content_bytes.decode('utf-8', errors='replace')
+        return content.strip()
     
     def _is_code_file(self, file_path: str) -> bool:
         """Check if file is a code file."""
-        code_extensions = {'.py', '.js', '.ts', '.java', '.cpp', '.c', '.h', '.hpp', '.go', '.rs', '.php', '.rb'}
-        file_ext = '.' + file_path.split('.')[-1].lower() if '.' in file_path else ''
-        return file_ext in code_extensions
+        return _file_extension(file_path) in _CODE_EXTENSIONS
     
     def _get_file_extension(self, file_path: str) -> str:
         """Get file extension."""
-        return '.' + file_path.split('.')[-1].lower() if '.' in file_path else ''
+        return _file_extension(file_path)
     
     async def validate_repository_url(self, repo_url: str) -> bool:
         """
@@ -468,10 +611,4 @@ class GitHubRepositoryProcessor:
     
     def _analyze_file_types(self, files: List[Dict[str, Any]]) -> Dict[str, int]:
         """Analyze file types in the repository."""
-        file_types = {}
-        
-        for file_info in files:
-            file_ext = self._get_file_extension(file_info['path'])
-            file_types[file_ext] = file_types.get(file_ext, 0) + 1
-        
-        return file_types
\ No newline at end of file
+        return dict(Counter(_file_extension(file_info['path']) for file_info in files))
\ No newline at end of file
@@ -6,9 +6,10 @@ Supports HTML parsing, PDF extraction, and plain text content.
 import asyncio
 import aiohttp
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from urllib.parse import urlparse, urljoin
 from datetime import datetime
+from functools import lru_cache
 import re
 
 # HTML parsing
@@ -18,6 +19,21 @@ try:
 except ImportError:
     BS4_AVAILABLE = False
 
+# Charset detection for pages without a usable declared charset
+try:
+    from charset_normalizer import from_bytes
+    CHARSET_NORMALIZER_AVAILABLE = True
+except ImportError:
+    CHARSET_NORMALIZER_AVAILABLE = False
+
+# Faster HTML parsing (preferred over BeautifulSoup when installed)
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
 # PDF processing for URLs
 try:
     import PyPDF2
@@ -35,6 +51,64 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Page chrome removed before extracting text
+_NON_CONTENT_TAGS = ("script", "style", "nav", "header", "footer", "aside")
+
+# Hosts that must not be fetched: localhost and private IPv4 prefixes (basic SSRF guard)
+_BLOCKED_HOSTS = frozenset({'localhost', '127.0.0.1', '0.0.0.0'})
+_PRIVATE_IP_PREFIXES = ('192.168.', '10.', '172.')
+
+# charset parameter of a Content-Type header
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Bytes inspected when detecting the charset of a page
+_DETECTION_SAMPLE_SIZE = 64 * 1024
+
+# Chunk size used when streaming response bodies
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Text cleanup patterns, compiled once. URLs and e-mail addresses are tried before
+# the artifact words at each position so they are removed whole.
+_WHITESPACE_RE = re.compile(r'\s+')
+_WEB_ARTIFACT_RE = re.compile(
+    r'https?://[^\s]+'
+    r'|\S+@\S+\.\S+'
+    r'|Cookie|Privacy Policy|Terms of Service|Subscribe|Newsletter',
+    re.IGNORECASE
+)
+
+# Candidate main-content containers, in order of preference
+_MAIN_CONTENT_SELECTORS = ['main', 'article', '.content', '#content', '.post', '.entry']
+
+if LXML_AVAILABLE:
+    _LXML_PARSER = lxml.html.HTMLParser(encoding='utf-8', remove_comments=True)
+    
+    def _selector_xpath(selector: str) -> str:
+        """Translate one of the simple tag/.class/#id selectors above to XPath."""
+        if selector.startswith('.'):
+            return f'//*[contains(concat(" ", normalize-space(@class), " "), " {selector[1:]} ")]'
+        if selector.startswith('#'):
+            return f'//*[@id="{selector[1:]}"]'
+        return f'//{selector}'
+    
+    _MAIN_CONTENT_XPATHS = tuple(etree.XPath(_selector_xpath(selector)) for selector in _MAIN_CONTENT_SELECTORS)
+
+
+@lru_cache(maxsize=1024)
+def _is_allowed_origin(scheme: str, hostname: Optional[str]) -> bool:
+    """Check a URL's scheme and host; cached since batches often repeat hosts."""
+    # Check scheme (also rejects file://, javascript: and other suspicious schemes)
+    if scheme not in ('http', 'https'):
+        return False
+    
+    # Check for localhost/private IPs (basic security)
+    if hostname:
+        hostname = hostname.lower()
+        if hostname in _BLOCKED_HOSTS or hostname.startswith(_PRIVATE_IP_PREFIXES):
+            return False
+    
+    return True
+
 
 class URLContentExtractor:
     """
@@ -47,6 +121,8 @@ class URLContentExtractor:
         self.timeout = aiohttp.ClientTimeout(total=30)
         self.max_content_size = 5 * 1024 * 1024  # 5MB
         self.max_redirects = 5
+        self.max_concurrent_requests = 5
+        self.probe_with_head = True  # HEAD first to skip unsupported or oversized bodies
         
         # Supported content types
         self.content_parsers = {
@@ -56,9 +132,12 @@ class URLContentExtractor:
             'application/pdf': self._parse_pdf_content if PDF_AVAILABLE else None,
         }
         
-        # Rate limiting
-        self.request_delay = 1.0  # seconds between requests
-        self.last_request_time = 0
+        # Rate limiting (token bucket: bursts of burst_size, then requests_per_second)
+        self.requests_per_second = 1.0
+        self.burst_size = 1
+        self._tokens = 0.0
+        self._last_refill = None
+        self._rate_lock = asyncio.Lock()
         
         logger.info("🌐 URLContentExtractor initialized")
         if not BS4_AVAILABLE:
@@ -102,6 +181,10 @@ class URLContentExtractor:
             if not await self.validate_url(url):
                 raise ValueError(f"Invalid or unsafe URL: {url}")
             
+            # Cheap HEAD check before transferring the body
+            if self.probe_with_head:
+                await self._probe_url(url)
+            
             # Fetch content
             content_data = await self._fetch_url_content(url)
             
@@ -134,14 +217,60 @@ class URLContentExtractor:
             raise
     
     async def _apply_rate_limit(self):
-        """Apply rate limiting between requests."""
-        current_time = asyncio.get_event_loop().time()
-        time_since_last = current_time - self.last_request_time
+        """Take a token from the request bucket, waiting for a refill when it is empty."""
+        # Reserve the token under the lock and sleep outside it, so waiters queue by debt
+        async with self._rate_lock:
+            now = asyncio.get_running_loop().time()
+            
+            if self._last_refill is None:
+                self._tokens = float(self.burst_size)
+            else:
+                elapsed = now - self._last_refill
+                self._tokens = min(float(self.burst_size), self._tokens + elapsed * self.requests_per_second)
+            self._last_refill = now
+            
+            self._tokens -= 1
+            wait = -self._tokens / self.requests_per_second if self._tokens < 0 else 0.0
+        
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    async def _probe_url(self, url: str):
+        """
+        Reject a URL from its HEAD response when the body is unsupported or too large.
+        
+        Servers that refuse or fail HEAD are left to the GET request.
+        """
+        try:
+            async with self.session.head(
+                url,
+                max_redirects=self.max_redirects,
+                allow_redirects=True
+            ) as response:
+                if response.status >= 400:
+                    return
+                content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+                content_length = response.headers.get('content-length')
+        except Exception as e:
+            logger.debug(f"HEAD probe failed for {url}, falling back to GET: {e}")
+            return
         
-        if time_since_last < self.request_delay:
-            await asyncio.sleep(self.request_delay - time_since_last)
+        if not self._is_supported_content_type(content_type):
+            raise ValueError(f"Unsupported content type: {content_type}")
         
-        self.last_request_time = asyncio.get_event_loop().time()
+        if content_length and content_length.isdigit() and int(content_length) > self.max_content_size:
+            raise ValueError(f"Content too large: {content_length} bytes")
+    
+    def _is_supported_content_type(self, content_type: str) -> bool:
+        """Whether a body of this type can be parsed (unknown types are given the benefit of the doubt)."""
+        if not content_type or content_type.startswith('text/'):
+            return True
+        if content_type.endswith(('+xml', '+json')) or content_type in ('application/json', 'application/xml'):
+            return True
+        return any(
+            content_type.startswith(supported_type) and parser is not None
+            for supported_type, parser in self.content_parsers.items()
+        )
     
     async def _fetch_url_content(self, url: str) -> Dict[str, Any]:
         """Fetch raw content from URL."""
@@ -166,14 +295,22 @@ class URLContentExtractor:
                 if content_length and int(content_length) > self.max_content_size:
                     raise ValueError(f"Content too large: {content_length} bytes")
                 
-                # Read content with size limit
-                content = await response.read()
-                if len(content) > self.max_content_size:
-                    raise ValueError(f"Content too large: {len(content)} bytes")
+                # Stream content, aborting as soon as the size limit is passed;
+                # Content-Length can be missing or wrong
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(_STREAM_CHUNK_SIZE):
+                    body.extend(chunk)
+                    if len(body) > self.max_content_size:
+                        raise ValueError(f"Content too large: over {self.max_content_size} bytes")
+                content = bytes(body)
+                
+                content_type_header = response.headers.get('content-type', '')
+                charset_match = _CHARSET_RE.search(content_type_header)
                 
                 return {
                     'content': content,
-                    'content_type': response.headers.get('content-type', '').split(';')[0].strip(),
+                    'content_type': content_type_header.split(';')[0].strip(),
+                    'charset': charset_match.group(1) if charset_match else None,
                     'status_code': response.status,
                     'final_url': str(response.url),
                     'headers': dict(response.headers)
@@ -205,39 +342,18 @@ class URLContentExtractor:
     
     async def _parse_html_content(self, content: bytes, content_data: Dict[str, Any]) -> Dict[str, Any]:
         """Parse HTML content and extract text."""
-        if not BS4_AVAILABLE:
+        if not (LXML_AVAILABLE or BS4_AVAILABLE):
             raise ValueError("HTML parsing not available - install beautifulsoup4")
         
         try:
             # Decode content
-            text_content = self._decode_content(content)
-            
-            # Parse HTML
-            soup = BeautifulSoup(text_content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "header", "footer", "aside"]):
-                script.decompose()
+            text_content = self._decode_content(content, content_data.get('charset'))
             
-            # Extract title
-            title = ""
-            title_tag = soup.find('title')
-            if title_tag:
-                title = title_tag.get_text().strip()
-            
-            # Extract main content
-            # Try to find main content areas
-            main_content = None
-            for selector in ['main', 'article', '.content', '#content', '.post', '.entry']:
-                main_content = soup.select_one(selector)
-                if main_content:
-                    break
-            
-            if not main_content:
-                main_content = soup.find('body') or soup
-            
-            # Extract text
-            text = main_content.get_text()
+            # Parse HTML and extract title and main content text
+            if LXML_AVAILABLE:
+                title, text = self._extract_html_lxml(text_content)
+            else:
+                title, text = self._extract_html_bs4(text_content)
             
             # Clean up text
             text = self._clean_extracted_text(text)
@@ -253,10 +369,62 @@ class URLContentExtractor:
             # Fallback to text parsing
             return await self._parse_text_content(content, content_data)
     
+    def _extract_html_lxml(self, text_content: str) -> Tuple[str, str]:
+        """Extract (title, main text) with lxml in a single C-level parse."""
+        # Re-encoded so documents with an XML encoding declaration still parse
+        tree = lxml.html.document_fromstring(text_content.encode('utf-8'), parser=_LXML_PARSER)
+        
+        # Remove script and style elements
+        etree.strip_elements(tree, *_NON_CONTENT_TAGS, with_tail=False)
+        
+        # Extract title
+        title = (tree.findtext('.//title') or '').strip()
+        
+        # Try to find main content areas
+        main_content = None
+        for xpath in _MAIN_CONTENT_XPATHS:
+            matches = xpath(tree)
+            if matches:
+                main_content = matches[0]
+                break
+        
+        if main_content is None:
+            main_content = tree.find('body')
+            if main_content is None:
+                main_content = tree
+        
+        return title, main_content.text_content()
+    
+    def _extract_html_bs4(self, text_content: str) -> Tuple[str, str]:
+        """Extract (title, main text) with BeautifulSoup's pure-Python parser."""
+        soup = BeautifulSoup(text_content, 'html.parser')
+        
+        # Remove script and style elements
+        for script in soup(list(_NON_CONTENT_TAGS)):
+            script.decompose()
+        
+        # Extract title
+        title = ""
+        title_tag = soup.find('title')
+        if title_tag:
+            title = title_tag.get_text().strip()
+        
+        # Try to find main content areas
+        main_content = None
+        for selector in _MAIN_CONTENT_SELECTORS:
+            main_content = soup.select_one(selector)
+            if main_content:
+                break
+        
+        if not main_content:
+            main_content = soup.find('body') or soup
+        
+        return title, main_content.get_text()
+    
     async def _parse_text_content(self, content: bytes, content_data: Dict[str, Any]) -> Dict[str, Any]:
         """Parse plain text content."""
         try:
-            text = self._decode_content(content)
+            text = self._decode_content(content, content_data.get('charset'))
             text = self._clean_extracted_text(text)
             
             return {
@@ -313,36 +481,41 @@ class URLContentExtractor:
             logger.error(f"❌ PDF parsing error: {e}")
             raise
     
-    def _decode_content(self, content: bytes) -> str:
+    def _decode_content(self, content: bytes, declared_charset: Optional[str] = None) -> str:
         """Decode bytes content to string."""
-        # Try different encodings
-        encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
-        
-        for encoding in encodings:
+        # Trust the server's declared charset first
+        if declared_charset:
             try:
-                return content.decode(encoding)
-            except UnicodeDecodeError:
-                continue
+                return content.decode(declared_charset)
+            except (UnicodeDecodeError, LookupError):
+                pass
+        
+        # Most of the web is UTF-8; utf-8-sig also drops a leading BOM
+        try:
+            return content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            pass
+        
+        # Detect on a bounded sample instead of trial-decoding the whole body
+        if CHARSET_NORMALIZER_AVAILABLE:
+            best = from_bytes(content[:_DETECTION_SAMPLE_SIZE]).best()
+            # Guesses without language coherence are arbitrary on short inputs
+            if best is not None and best.coherence > 0:
+                try:
+                    return content.decode(best.encoding)
+                except (UnicodeDecodeError, LookupError):
+                    pass
         
-        # If all fail, use utf-8 with error handling
-        return content.decode('utf-8', errors='replace')
+        # latin-1 maps every byte, so this never fails
+        return content.decode('latin-1')
     
     def _clean_extracted_text(self, text: str) -> str:
         """Clean and normalize extracted text."""
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove excessive line breaks
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
-        
-        # Remove common web artifacts
-        text = re.sub(r'(Cookie|Privacy Policy|Terms of Service|Subscribe|Newsletter)', '', text, flags=re.IGNORECASE)
-        
-        # Remove URLs
-        text = re.sub(r'https?://[^\s]+', '', text)
+        # Normalize whitespace (this also collapses runs of line breaks)
+        text = _WHITESPACE_RE.sub(' ', text)
         
-        # Remove email addresses
-        text = re.sub(r'\S+@\S+\.\S+', '', text)
+        # Remove URLs, email addresses and common web artifacts in one pass
+        text = _WEB_ARTIFACT_RE.sub('', text)
         
         return text.strip()
     
@@ -358,29 +531,7 @@ class URLContentExtractor:
         """
         try:
             parsed = urlparse(url)
-            
-            # Check scheme
-            if parsed.scheme not in ['http', 'https']:
-                return False
-            
-            # Check for localhost/private IPs (basic security)
-            hostname = parsed.hostname
-            if hostname:
-                hostname = hostname.lower()
-                
-                # Block localhost
-                if hostname in ['localhost', '127.0.0.1', '0.0.0.0']:
-                    return False
-                
-                # Block private IP ranges (basic check)
-                if hostname.startswith(('192.168.', '10.', '172.')):
-                    return False
-                
-                # Block file:// and other suspicious schemes
-                if parsed.scheme not in ['http', 'https']:
-                    return False
-            
-            return True
+            return _is_allowed_origin(parsed.scheme, parsed.hostname)
             
         except Exception:
             return False
@@ -428,26 +579,17 @@ class URLContentExtractor:
         if len(urls) > 10:  # Limit concurrent requests
             raise ValueError("Too many URLs. Maximum 10 URLs allowed per batch")
         
-        results = {}
-        
-        # Create tasks for concurrent processing
-        tasks = []
-        for url in urls:
-            task = asyncio.create_task(self._extract_single_url_safe(url))
-            tasks.append((url, task))
+        # Fetch each distinct URL once, a bounded number at a time
+        unique_urls = list(dict.fromkeys(urls))
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
         
-        # Wait for all tasks to complete
-        for url, task in tasks:
-            try:
-                result = await task
-                results[url] = result
-            except Exception as e:
-                results[url] = {
-                    'error': str(e),
-                    'success': False
-                }
+        async def extract_bounded(url: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._extract_single_url_safe(url)
         
-        return results
+        # _extract_single_url_safe never raises, so gather needs no exception handling
+        results = await asyncio.gather(*(extract_bounded(url) for url in unique_urls))
+        return dict(zip(unique_urls, results))
     
     async def _extract_single_url_safe(self, url: str) -> Dict[str, Any]:
         """Safely extract content from a single URL with error handling."""
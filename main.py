@@ -1,8 +1,9 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, File, UploadFile
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import asyncio
 import os
 import logging
 from datetime import datetime
@@ -41,6 +42,7 @@ from core.ai.mem0_integration_service import Mem0IntegrationService
 
 # Import dynamic context services
 from services.dynamic_context_service import DynamicContextService
+from core.processing.file_upload_handler import get_file_upload_handler
 
 load_dotenv()
 
@@ -68,7 +70,11 @@ app.add_middleware(
 )
 
 # Initialize services with dependency injection
-vector_service = VectorService()
+vector_service = VectorService(
+    use_onnx=config.ai.embedding_backend == "onnx",
+    onnx_model_path=config.ai.onnx_model_path,
+    device=config.ai.embedding_device
+)
 neo4j_service = Neo4jService()
 context_repository = ContextRepository(neo4j_service)
 integration_service = IntegrationService(vector_service, context_repository)
@@ -129,6 +135,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup services"""
+    await dynamic_context_service.close()
     await neo4j_service.close()
     print("✅ Services closed")
 
@@ -571,9 +578,49 @@ async def upload_files_for_processing(request: FileUploadRequest):
     
     Accepts multiple files and processes them through the dynamic context pipeline.
     """
+    return await _start_upload_processing(request.files)
+
+
+@app.post("/api/dynamic-context/upload/multipart", response_model=DynamicContextResponse)
+async def upload_multipart_files_for_processing(files: List[UploadFile] = File(...)):
+    """
+    Process files uploaded as multipart form data.
+    
+    Raw file bytes skip the base64 encode/decode of the JSON upload endpoint,
+    which matters for large files.
+    """
+    file_data = []
+    try:
+        for upload in files:
+            # Parts sent without a Content-Type fall back to the type guessed from the filename
+            content_type = upload.content_type or ''
+            # Invalid and oversized files are rejected before being buffered in full
+            validation, content = await get_file_upload_handler().validate_file_stream(
+                upload.filename, content_type, upload.size, upload
+            )
+            if content is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File validation failed: {', '.join(validation['errors'])}"
+                )
+            file_data.append({
+                'filename': upload.filename,
+                'content_type': content_type,
+                'content': content
+            })
+    except (OSError, ValueError) as e:
+        # Unreadable or undecodable uploads are client errors, not server failures
+        logger.error(f"❌ Multipart upload read error: {e}")
+        raise HTTPException(status_code=400, detail=f"Could not read uploaded file: {e}")
+    
+    return await _start_upload_processing(file_data)
+
+
+async def _start_upload_processing(files: List[Dict]) -> DynamicContextResponse:
+    """Validate uploaded files and start processing them."""
     try:
         # Validate files
-        validation_result = await dynamic_context_service.validate_source('upload', {'files': request.files})
+        validation_result = await dynamic_context_service.validate_source('upload', {'files': files})
         
         if not validation_result['valid']:
             raise HTTPException(
@@ -583,15 +630,15 @@ async def upload_files_for_processing(request: FileUploadRequest):
         
         # Start processing
         task_id = await dynamic_context_service.process_dynamic_content('upload', {
-            'identifier': f"{len(request.files)} uploaded files",
-            'files': request.files
+            'identifier': f"{len(files)} uploaded files",
+            'files': files
         })
         
         return DynamicContextResponse(
             task_id=task_id,
-            message=f"Started processing {len(request.files)} uploaded files",
+            message=f"Started processing {len(files)} uploaded files",
             source_type="upload",
-            estimated_processing_time=len(request.files) * 5
+            estimated_processing_time=len(files) * 5
         )
         
     except Exception as e:
@@ -673,13 +720,22 @@ async def process_github_repository(request: GitHubProcessingRequest):
 
 
 @app.get("/api/dynamic-context/status/{task_id}", response_model=ProcessingStatusResponse)
-async def get_processing_status(task_id: str):
+async def get_processing_status(task_id: str, wait: float = 0):
     """
     Get the processing status of a dynamic content task.
     
+    With wait > 0 the request long-polls: it returns as soon as the task
+    finishes, or after at most `wait` seconds (capped at 30).
+    
     Returns current status, progress information, and results if completed.
     """
     try:
+        if wait > 0:
+            try:
+                await asyncio.wait_for(dynamic_context_service.await_task(task_id), min(wait, 30.0))
+            except asyncio.TimeoutError:
+                pass
+        
         result = dynamic_context_service.get_processing_status(task_id)
         
         if not result:
@@ -14,7 +14,7 @@ import logging
 from core.database.document_processor import DocumentProcessor
 from core.database.vector_service import VectorService
 from core.ai.mem0_manager import Mem0Manager
-from core.processing.file_upload_handler import FileUploadHandler
+from core.processing.file_upload_handler import get_file_upload_handler
 from core.processing.url_content_extractor import URLContentExtractor
 from core.processing.github_repository_processor import GitHubRepositoryProcessor
 from models.dynamic_context_models import ProcessingStatus
@@ -62,6 +62,14 @@ class DynamicContextService:
     Integrates with existing vector service and memory layer.
     """
     
+    # Vector writes from concurrent tasks are coalesced into shared batches
+    VECTOR_BATCH_SIZE = 256
+    VECTOR_FLUSH_SECONDS = 0.05
+    
+    # Each coalesced batch is embedded as sub-batches with overlapping round-trips
+    EMBED_BATCH_SIZE = 64
+    MAX_INFLIGHT_EMBED_BATCHES = 5
+    
     def __init__(self, document_processor: DocumentProcessor, 
                  vector_service: VectorService,
                  memory_manager: Mem0Manager):
@@ -70,12 +78,18 @@ class DynamicContextService:
         self.memory_manager = memory_manager
         
         # Initialize specialized handlers
-        self.file_upload_handler = FileUploadHandler()
+        self.file_upload_handler = get_file_upload_handler()
         self.url_content_extractor = URLContentExtractor()
         self.github_processor = GitHubRepositoryProcessor()
         
         # Task tracking
         self.processing_tasks: Dict[str, ProcessingResult] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        
+        # Shared vector batch writer
+        self._chunk_queue: asyncio.Queue = asyncio.Queue()
+        self._batch_writer: Optional[asyncio.Task] = None
+        self._embed_semaphore = asyncio.Semaphore(self.MAX_INFLIGHT_EMBED_BATCHES)
         
         # Processing limits
         self.max_file_size = 10 * 1024 * 1024  # 10MB
@@ -114,8 +128,10 @@ class DynamicContextService:
         
         self.processing_tasks[task_id] = processing_result
         
-        # Start async processing
-        asyncio.create_task(self._process_content_async(task_id, source_type, content_data))
+        # Start async processing, keeping a reference so the task can be awaited
+        task = asyncio.create_task(self._process_content_async(task_id, source_type, content_data))
+        self._tasks[task_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(task_id, None))
         
         logger.info(f"📋 Started processing task {task_id} for {source_type}")
         return task_id
@@ -212,12 +228,12 @@ class DynamicContextService:
             }
             
             for doc in processed_docs:
-                combined_content.append(f"=== {doc['source']} ===\n{doc['content']}")
+                combined_content.append(f"=== {doc.source} ===\n{doc.content}")
                 combined_metadata['file_details'].append({
-                    'filename': doc['source'],
-                    'content_type': doc['content_type'],
-                    'character_count': doc['metadata']['character_count'],
-                    'word_count': doc['metadata']['word_count']
+                    'filename': doc.source,
+                    'content_type': doc.content_type,
+                    'character_count': doc.metadata['character_count'],
+                    'word_count': doc.metadata['word_count']
                 })
             
             # Create combined dynamic content
@@ -380,7 +396,7 @@ class DynamicContextService:
         try:
             # Store in vector database
             if processed_docs:
-                await self.vector_service._add_document_batch(processed_docs)
+                await self._add_to_vector_store(processed_docs)
                 stats['vector_embeddings'] = len(processed_docs)
                 logger.info(f"📊 Stored {len(processed_docs)} chunks in vector database")
             
@@ -471,6 +487,87 @@ class DynamicContextService:
         
         return stats
     
+    async def _add_to_vector_store(self, docs: List[Dict[str, Any]]):
+        """Queue chunks for the shared batch writer and wait until they are stored."""
+        if self._batch_writer is None or self._batch_writer.done():
+            self._batch_writer = asyncio.create_task(self._run_batch_writer())
+        
+        stored = asyncio.get_running_loop().create_future()
+        await self._chunk_queue.put((docs, stored))
+        await stored
+    
+    async def flush(self):
+        """Wait until every chunk queued so far has been written to the vector store."""
+        await self._chunk_queue.join()
+    
+    async def close(self):
+        """Drain queued vector writes and stop the shared batch writer."""
+        writer = self._batch_writer
+        if writer is not None and not writer.done():
+            await self._chunk_queue.join()
+            writer.cancel()
+            try:
+                await writer
+            except asyncio.CancelledError:
+                pass
+        
+        if self._batch_writer is writer:
+            self._batch_writer = None
+        logger.info("🛑 Vector batch writer stopped")
+    
+    async def _run_batch_writer(self):
+        """Write queued chunks in batches of up to VECTOR_BATCH_SIZE, waiting at most VECTOR_FLUSH_SECONDS to fill one."""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            pending = [await self._chunk_queue.get()]
+            batch_size = len(pending[0][0])
+            deadline = loop.time() + self.VECTOR_FLUSH_SECONDS
+            
+            while batch_size < self.VECTOR_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._chunk_queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                batch_size += len(item[0])
+            
+            batch = [doc for docs, _ in pending for doc in docs]
+            try:
+                await self._write_vector_batch(batch)
+            except Exception as e:
+                for _, stored in pending:
+                    if not stored.done():
+                        stored.set_exception(e)
+            else:
+                for _, stored in pending:
+                    if not stored.done():
+                        stored.set_result(None)
+            finally:
+                for _ in pending:
+                    self._chunk_queue.task_done()
+            
+            if len(pending) > 1:
+                logger.info(f"📦 Coalesced {len(pending)} chunk writes into one batch of {len(batch)}")
+    
+    async def _write_vector_batch(self, batch: List[Dict[str, Any]]):
+        """Embed and store a batch as EMBED_BATCH_SIZE sub-batches, up to MAX_INFLIGHT_EMBED_BATCHES at once."""
+        async def write_sub_batch(sub_batch: List[Dict[str, Any]]):
+            async with self._embed_semaphore:
+                await self.vector_service._add_document_batch(sub_batch)
+        
+        # Group similarly sized chunks so each sub-batch pads to a similar length.
+        # Vector IDs come from each chunk's source and chunk_id, so order does not matter.
+        batch = sorted(batch, key=lambda doc: len(doc['content']))
+        
+        await asyncio.gather(*(
+            write_sub_batch(batch[start:start + self.EMBED_BATCH_SIZE])
+            for start in range(0, len(batch), self.EMBED_BATCH_SIZE)
+        ))
+    
     def _determine_content_type(self, dynamic_content: DynamicContent) -> str:
         """Determine content type for document processor."""
         if dynamic_content.source_type == 'upload':
@@ -618,6 +715,21 @@ class DynamicContextService:
         
         return result
     
+    async def await_task(self, task_id: str) -> Optional[ProcessingResult]:
+        """
+        Wait for a processing task to finish.
+        
+        Callers that need a deadline can wrap this in asyncio.wait_for.
+        
+        Returns:
+            Final processing result, or None for an unknown task ID
+        """
+        task = self._tasks.get(task_id)
+        if task is not None:
+            # Shielded so a caller's timeout or cancellation never cancels the processing itself
+            await asyncio.shield(task)
+        return self.processing_tasks.get(task_id)
+    
     def get_processing_status(self, task_id: str) -> Optional[ProcessingResult]:
         """Get processing status for a task."""
         return self.processing_tasks.get(task_id)
@@ -5,31 +5,82 @@ Tests file upload, URL processing, and GitHub repository processing.
 """
 
 import asyncio
-import json
+import io
+import logging
+import sys
 import aiohttp
+import orjson
 import time
-from typing import Dict, Any
+from dataclasses import dataclass
+from typing import Dict, Any, List, Tuple
+
+# Faster event loop when available
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
 
 BASE_URL = "http://localhost:8000"
+MULTIPART_THRESHOLD = 64 * 1024  # Upload larger files as multipart instead of inline JSON
+LONG_POLL_SECONDS = 10.0  # Longest a single status request waits for its task to finish
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+
+
+@dataclass(slots=True)
+class TestResult:
+    """Outcome of a single smoke test."""
+    __test__ = False  # Not a pytest test class
+    
+    name: str
+    passed: bool
+    elapsed: float
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Create a client session that serializes request bodies with orjson."""
+    return aiohttp.ClientSession(json_serialize=lambda obj: orjson.dumps(obj).decode())
+
+
+def _post_upload(session: aiohttp.ClientSession, filename: str,
+                 content: bytes, content_type: str):
+    """Post a file inline as JSON, or as multipart form data once it is large."""
+    if len(content) > MULTIPART_THRESHOLD:
+        form = aiohttp.FormData()
+        form.add_field('files', io.BytesIO(content), filename=filename, content_type=content_type)
+        return session.post(f"{BASE_URL}/api/dynamic-context/upload/multipart", data=form)
+    
+    files = [{
+        "filename": filename,
+        "content": content.decode('utf-8'),
+        "content_type": content_type,
+        "size": len(content)
+    }]
+    return session.post(f"{BASE_URL}/api/dynamic-context/upload", json={"files": files})
 
 async def test_system_health():
     """Test system health and initialization."""
-    print("🔍 Testing system health...")
+    logger.info("🔍 Testing system health...")
     
-    async with aiohttp.ClientSession() as session:
+    async with create_session() as session:
         # Check health
         async with session.get(f"{BASE_URL}/api/health") as response:
             if response.status == 200:
-                data = await response.json()
-                print(f"✅ System health: {data['status']}")
+                data = await response.json(loads=orjson.loads)
+                logger.info(f"✅ System health: {data['status']}")
                 return True
             else:
-                print(f"❌ Health check failed: {response.status}")
+                logger.info(f"❌ Health check failed: {response.status}")
                 return False
 
 async def test_file_upload():
     """Test file upload processing."""
-    print("\n📁 Testing file upload...")
+    logger.info("\n📁 Testing file upload...")
     
     # Create a test file
     test_content = """
@@ -52,123 +103,150 @@ The system should extract and chunk this content, then store it in:
 This content should become immediately available for LLM context retrieval.
 """
     
-    files = [{
-        "filename": "test_document.md",
-        "content": test_content,
-        "content_type": "text/markdown",
-        "size": len(test_content.encode('utf-8'))
-    }]
+    content_bytes = test_content.encode('utf-8')
     
-    async with aiohttp.ClientSession() as session:
+    async with create_session() as session:
         # Upload file
-        async with session.post(
-            f"{BASE_URL}/api/dynamic-context/upload",
-            json={"files": files}
-        ) as response:
+        async with _post_upload(session, "test_document.md", content_bytes, "text/markdown") as response:
             if response.status == 200:
-                data = await response.json()
+                data = await response.json(loads=orjson.loads)
                 task_id = data["task_id"]
-                print(f"✅ File upload started: {task_id}")
+                logger.info(f"✅ File upload started: {task_id}")
                 
                 # Monitor processing
                 await monitor_task(session, task_id)
                 return True
             else:
-                error_data = await response.json()
-                print(f"❌ File upload failed: {error_data}")
+                error_data = await response.json(loads=orjson.loads)
+                logger.info(f"❌ File upload failed: {error_data}")
                 return False
 
 async def test_url_processing():
     """Test URL content processing."""
-    print("\n🌐 Testing URL processing...")
+    logger.info("\n🌐 Testing URL processing...")
     
     # Use a simple, reliable URL
     test_url = "https://httpbin.org/json"
     
-    async with aiohttp.ClientSession() as session:
+    async with create_session() as session:
         # Process URL
         async with session.post(
             f"{BASE_URL}/api/dynamic-context/url",
             json={"url": test_url}
         ) as response:
             if response.status == 200:
-                data = await response.json()
+                data = await response.json(loads=orjson.loads)
                 task_id = data["task_id"]
-                print(f"✅ URL processing started: {task_id}")
+                logger.info(f"✅ URL processing started: {task_id}")
                 
                 # Monitor processing
                 await monitor_task(session, task_id)
                 return True
             else:
-                error_data = await response.json()
-                print(f"❌ URL processing failed: {error_data}")
+                error_data = await response.json(loads=orjson.loads)
+                logger.info(f"❌ URL processing failed: {error_data}")
                 return False
 
 async def test_github_processing():
     """Test GitHub repository processing."""
-    print("\n🐙 Testing GitHub processing...")
+    logger.info("\n🐙 Testing GitHub processing...")
     
     # Use a small, public repository with documentation
     test_repo = "https://github.com/octocat/Hello-World"
     
-    async with aiohttp.ClientSession() as session:
+    async with create_session() as session:
         # Process repository
         async with session.post(
             f"{BASE_URL}/api/dynamic-context/github",
             json={"repo_url": test_repo}
         ) as response:
             if response.status == 200:
-                data = await response.json()
+                data = await response.json(loads=orjson.loads)
                 task_id = data["task_id"]
-                print(f"✅ GitHub processing started: {task_id}")
+                logger.info(f"✅ GitHub processing started: {task_id}")
                 
                 # Monitor processing
                 await monitor_task(session, task_id)
                 return True
             else:
-                error_data = await response.json()
-                print(f"❌ GitHub processing failed: {error_data}")
+                error_data = await response.json(loads=orjson.loads)
+                logger.info(f"❌ GitHub processing failed: {error_data}")
                 return False
 
-async def monitor_task(session: aiohttp.ClientSession, task_id: str, max_wait: int = 60):
-    """Monitor task processing status."""
-    print(f"⏳ Monitoring task {task_id}...")
+async def _poll_status(session: aiohttp.ClientSession, task_id: str, wait: float = 0) -> Tuple[int, Dict[str, Any]]:
+    """Fetch the status of a single task, long-polling up to `wait` seconds for it to finish."""
+    async with session.get(
+        f"{BASE_URL}/api/dynamic-context/status/{task_id}",
+        params={"wait": f"{wait:.1f}"}
+    ) as response:
+        if response.status != 200:
+            return response.status, {}
+        return response.status, orjson.loads(await response.read())
+
+async def monitor_tasks(session: aiohttp.ClientSession, task_ids: List[str], max_wait: int = 60) -> Dict[str, bool]:
+    """Monitor several tasks, polling all pending ones concurrently."""
+    logger.info(f"⏳ Monitoring tasks {', '.join(task_ids)}...")
     
+    results = {}
+    last_status = {}
+    pending = list(task_ids)
     start_time = time.time()
-    while time.time() - start_time < max_wait:
-        async with session.get(f"{BASE_URL}/api/dynamic-context/status/{task_id}") as response:
-            if response.status == 200:
-                data = await response.json()
-                status = data["status"]
-                
-                if status == "completed":
-                    progress = data.get("progress", {})
-                    print(f"✅ Task completed!")
-                    print(f"   📄 Documents processed: {progress.get('documents_processed', 0)}")
-                    print(f"   🧩 Chunks created: {progress.get('chunks_created', 0)}")
-                    print(f"   🔢 Vector embeddings: {progress.get('vector_embeddings', 0)}")
-                    print(f"   🧠 Memory items: {progress.get('memory_items_stored', 0)}")
-                    return True
-                elif status == "failed":
-                    print(f"❌ Task failed: {data.get('message', 'Unknown error')}")
-                    return False
-                else:
-                    print(f"   Status: {status}")
-                    await asyncio.sleep(2)
+    while pending and time.time() - start_time < max_wait:
+        # The server holds each request until its task finishes, so no client-side sleep is needed
+        wait = max(0.0, min(LONG_POLL_SECONDS, max_wait - (time.time() - start_time)))
+        statuses = await asyncio.gather(*(_poll_status(session, task_id, wait) for task_id in pending))
+        
+        # Progress lines are collected per poll and only emitted on state changes
+        lines = []
+        still_pending = []
+        for task_id, (http_status, data) in zip(pending, statuses):
+            if http_status != 200:
+                lines.append(f"❌ Status check failed for {task_id}: {http_status}")
+                results[task_id] = False
+                continue
+            
+            status = data["status"]
+            if status == "completed":
+                progress = data.get("progress", {})
+                lines.extend([
+                    f"✅ Task {task_id} completed!",
+                    f"   📄 Documents processed: {progress.get('documents_processed', 0)}",
+                    f"   🧩 Chunks created: {progress.get('chunks_created', 0)}",
+                    f"   🔢 Vector embeddings: {progress.get('vector_embeddings', 0)}",
+                    f"   🧠 Memory items: {progress.get('memory_items_stored', 0)}",
+                ])
+                results[task_id] = True
+            elif status == "failed":
+                lines.append(f"❌ Task {task_id} failed: {data.get('message', 'Unknown error')}")
+                results[task_id] = False
             else:
-                print(f"❌ Status check failed: {response.status}")
-                return False
+                if last_status.get(task_id) != status:
+                    lines.append(f"   Status of {task_id}: {status}")
+                    last_status[task_id] = status
+                still_pending.append(task_id)
+        
+        if lines:
+            logger.info("\n".join(lines))
+        
+        pending = still_pending
     
-    print(f"⏰ Task monitoring timed out after {max_wait} seconds")
-    return False
+    for task_id in pending:
+        logger.info(f"⏰ Task {task_id} monitoring timed out after {max_wait} seconds")
+        results[task_id] = False
+    return results
+
+async def monitor_task(session: aiohttp.ClientSession, task_id: str, max_wait: int = 60):
+    """Monitor task processing status."""
+    results = await monitor_tasks(session, [task_id], max_wait)
+    return results[task_id]
 
 async def test_chat_integration():
     """Test that dynamically added content is available in chat."""
-    print("\n💬 Testing chat integration...")
+    logger.info("\n💬 Testing chat integration...")
     
     test_query = "Tell me about the test document and eKYC verification"
     
-    async with aiohttp.ClientSession() as session:
+    async with create_session() as session:
         async with session.post(
             f"{BASE_URL}/api/chat",
             json={
@@ -177,58 +255,58 @@ async def test_chat_integration():
             }
         ) as response:
             if response.status == 200:
-                data = await response.json()
-                print(f"✅ Chat response received")
-                print(f"   📝 Response length: {len(data['response'])} characters")
-                print(f"   📊 Context items: {data.get('processing_info', {}).get('total_context_items', 0)}")
+                data = await response.json(loads=orjson.loads)
+                logger.info(f"✅ Chat response received")
+                logger.info(f"   📝 Response length: {len(data['response'])} characters")
+                logger.info(f"   📊 Context items: {data.get('processing_info', {}).get('total_context_items', 0)}")
                 
                 # Check if our test content influenced the response
                 if "test document" in data['response'].lower() or "dynamic context" in data['response'].lower():
-                    print(f"✅ Dynamic content detected in response!")
+                    logger.info(f"✅ Dynamic content detected in response!")
                 else:
-                    print(f"⚠️ Dynamic content may not be influencing responses")
+                    logger.info(f"⚠️ Dynamic content may not be influencing responses")
                 
                 return True
             else:
-                error_data = await response.json()
-                print(f"❌ Chat test failed: {error_data}")
+                error_data = await response.json(loads=orjson.loads)
+                logger.info(f"❌ Chat test failed: {error_data}")
                 return False
 
 async def test_system_insights():
     """Test system insights endpoint."""
-    print("\n📊 Testing system insights...")
+    logger.info("\n📊 Testing system insights...")
     
-    async with aiohttp.ClientSession() as session:
+    async with create_session() as session:
         async with session.get(f"{BASE_URL}/api/dynamic-context/insights") as response:
             if response.status == 200:
-                data = await response.json()
-                print(f"✅ System insights retrieved")
+                data = await response.json(loads=orjson.loads)
+                logger.info(f"✅ System insights retrieved")
                 
                 processing_summary = data.get("processing_summary", {})
-                print(f"   📋 Total tasks: {processing_summary.get('total_tasks', 0)}")
-                print(f"   ✅ Completed: {processing_summary.get('completed_tasks', 0)}")
-                print(f"   ❌ Failed: {processing_summary.get('failed_tasks', 0)}")
+                logger.info(f"   📋 Total tasks: {processing_summary.get('total_tasks', 0)}")
+                logger.info(f"   ✅ Completed: {processing_summary.get('completed_tasks', 0)}")
+                logger.info(f"   ❌ Failed: {processing_summary.get('failed_tasks', 0)}")
                 
                 system_impact = data.get("system_impact", {})
-                print(f"   🧩 Total chunks added: {system_impact.get('total_chunks_added', 0)}")
-                print(f"   🧠 Memory items added: {system_impact.get('total_memory_items_added', 0)}")
+                logger.info(f"   🧩 Total chunks added: {system_impact.get('total_chunks_added', 0)}")
+                logger.info(f"   🧠 Memory items added: {system_impact.get('total_memory_items_added', 0)}")
                 
                 recommendations = data.get("recommendations", [])
                 if recommendations:
-                    print(f"   💡 Recommendations:")
+                    logger.info(f"   💡 Recommendations:")
                     for rec in recommendations:
-                        print(f"      - {rec}")
+                        logger.info(f"      - {rec}")
                 
                 return True
             else:
-                error_data = await response.json()
-                print(f"❌ Insights test failed: {error_data}")
+                error_data = await response.json(loads=orjson.loads)
+                logger.info(f"❌ Insights test failed: {error_data}")
                 return False
 
 async def main():
     """Run all tests."""
-    print("🚀 Starting Dynamic Context Ingestion System Tests")
-    print("=" * 60)
+    logger.info("🚀 Starting Dynamic Context Ingestion System Tests")
+    logger.info("=" * 60)
     
     tests = [
         ("System Health", test_system_health),
@@ -239,33 +317,34 @@ async def main():
         ("System Insights", test_system_insights)
     ]
     
-    results = []
+    results: List[TestResult] = []
     
     for test_name, test_func in tests:
+        t0 = time.perf_counter()
         try:
             result = await test_func()
-            results.append((test_name, result))
         except Exception as e:
-            print(f"❌ {test_name} test failed with exception: {e}")
-            results.append((test_name, False))
+            logger.info(f"❌ {test_name} test failed with exception: {e}")
+            result = False
+        results.append(TestResult(test_name, bool(result), time.perf_counter() - t0))
     
     # Summary
-    print("\n" + "=" * 60)
-    print("📋 Test Results Summary:")
-    
-    passed = 0
-    for test_name, result in results:
-        status = "✅ PASSED" if result else "❌ FAILED"
-        print(f"   {test_name}: {status}")
-        if result:
-            passed += 1
-    
-    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+    passed = sum(1 for r in results if r.passed)
+    lines = ["", "=" * 60, "📋 Test Results Summary:"]
+    lines.extend(
+        f"   {r.name}: {'✅ PASSED' if r.passed else '❌ FAILED'} ({r.elapsed:.2f}s)"
+        for r in results
+    )
+    lines.append(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
     
     if passed == len(results):
-        print("🎉 All tests passed! Dynamic context system is working correctly.")
+        lines.append("🎉 All tests passed! Dynamic context system is working correctly.")
     else:
-        print("⚠️ Some tests failed. Check the logs above for details.")
+        lines.append("⚠️ Some tests failed. Check the logs above for details.")
+    
+    sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
+    if UVLOOP_AVAILABLE:
+        uvloop.install()
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Shared pytest configuration for the test suite.
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import aiohttp
+import pytest
+
+
+# Captured at import, since tests patch aiohttp.ClientSession before building mocks
+_CLIENT_SESSION_SPEC = aiohttp.ClientSession
+_CLIENT_RESPONSE_SPEC = aiohttp.ClientResponse
+
+
+def _mock_response(status: int = 200, headers=None, **methods) -> MagicMock:
+    """Build a mocked aiohttp response; keyword arguments become async methods returning the value."""
+    response = MagicMock(spec=_CLIENT_RESPONSE_SPEC)
+    response.status = status
+    response.headers = headers if headers is not None else {}
+    for name, value in methods.items():
+        setattr(response, name, AsyncMock(return_value=value))
+    return response
+
+
+def _mock_session(*responses) -> MagicMock:
+    """Build a mocked aiohttp session whose get() calls yield the given responses in order."""
+    session = MagicMock(spec=_CLIENT_SESSION_SPEC)
+    session.get.return_value.__aenter__ = AsyncMock(side_effect=list(responses))
+    session.get.return_value.__aexit__ = AsyncMock(return_value=None)
+    return session
+
+
+@pytest.fixture(scope="module")
+def mocked_response_factory():
+    """Factory for mocked aiohttp responses (see _mock_response)."""
+    return _mock_response
+
+
+@pytest.fixture(scope="module")
+def mocked_session_factory():
+    """Factory for mocked aiohttp sessions (see _mock_session)."""
+    return _mock_session
@@ -0,0 +1,177 @@
+"""
+Unit tests for DocumentProcessor cleaning, chunking and file reading.
+"""
+
+import mmap
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+from core.database.document_processor import DocumentProcessor, _MMAP_THRESHOLD
+
+
+class TestDocumentProcessorCleaning:
+    
+    @pytest.fixture
+    def processor(self):
+        return DocumentProcessor()
+    
+    def test_markdown_headings_are_kept(self, processor):
+        """'#' starts a heading in markdown, not a comment."""
+        cleaned = processor._clean_content("# eKYC Flow\n\nCustomers verify with Aadhaar.\n", "docs/ekyc.md")
+        
+        assert cleaned == "# eKYC Flow Customers verify with Aadhaar."
+    
+    def test_python_hash_comments_are_removed(self, processor):
+        """Whole-line '#' comments are stripped from Python sources."""
+        content = "import os\n# resolve the base path\n    # indented comment\nBASE = os.getcwd()\n"
+        
+        assert processor._clean_content(content, "service.py") == "import os BASE = os.getcwd()"
+    
+    def test_java_comments_are_removed(self, processor):
+        """Block and '//' comments are stripped from Java sources, across CRLF line endings."""
+        content = "/**\r\n * Validates PAN.\r\n */\r\nclass PanValidator {\r\n    // TODO tighten\r\n    int length = 10;\r\n}\r\n"
+        
+        assert processor._clean_content(content, "PanValidator.java") == "class PanValidator { int length = 10; }"
+    
+    def test_whitespace_is_collapsed(self, processor):
+        """Runs of whitespace, including blank lines, become single spaces."""
+        assert processor._clean_content("a\t\tb\n\n\n\nc  d", "notes.txt") == "a b c d"
+
+
+class TestDocumentProcessorChunking:
+    
+    @pytest.fixture
+    def processor(self):
+        return DocumentProcessor()
+    
+    def test_small_content_is_one_chunk(self, processor):
+        """Content that fits in chunk_size produces a single chunk."""
+        chunks = processor._chunk_content("Short OTP guideline text.", "otp/guide.md", "OTP")
+        
+        assert len(chunks) == 1
+        assert chunks[0]['type'] == 'markdown_doc'
+        assert chunks[0]['metadata']['chunk_count'] == 1
+    
+    def test_chunks_break_at_sentence_boundaries(self, processor):
+        """Non-final chunks end on a sentence break in the second half of the window."""
+        content = "".join(f"Rule {i} requires the borrower to submit document {i}. " for i in range(100))
+        
+        chunks = processor._chunk_content(content, "rules.txt", "GENERAL")
+        
+        assert len(chunks) > 1
+        for chunk in chunks[:-1]:
+            assert chunk['content'].endswith('.')
+            assert processor.chunk_size // 2 < len(chunk['content']) <= processor.chunk_size
+        assert [chunk['chunk_id'] for chunk in chunks] == list(range(len(chunks)))
+        assert all(chunk['metadata']['chunk_count'] == len(chunks) for chunk in chunks)
+
+
+class TestDocumentProcessorScanning:
+    
+    @pytest.fixture
+    def processor(self):
+        return DocumentProcessor()
+    
+    def test_excluded_directories_are_pruned(self, processor, tmp_path):
+        """Only node_modules, .git, __pycache__, test and spec directories are skipped."""
+        for directory in ('node_modules/pkg', '.git', '__pycache__', 'test', 'spec', 'tests', 'venv', '.docs', 'Capabilities/EKYC'):
+            (tmp_path / directory).mkdir(parents=True)
+            (tmp_path / directory / 'notes.md').write_text('Some indexed notes.')
+        (tmp_path / '.hidden.md').write_text('Hidden file content.')
+        
+        found = {path.relative_to(tmp_path).as_posix() for path in processor._get_all_files(tmp_path)}
+        
+        assert found == {'tests/notes.md', 'venv/notes.md', '.docs/notes.md', 'Capabilities/EKYC/notes.md'}
+    
+    def test_symlinked_files_are_kept_and_symlinked_directories_skipped(self, processor, tmp_path):
+        """Symlinked files are indexed like rglob did; symlinked directories are not followed."""
+        shared = tmp_path / 'shared'
+        shared.mkdir()
+        (shared / 'policy.md').write_text('Shared lending policy notes.')
+        docs = tmp_path / 'docs'
+        docs.mkdir()
+        (docs / 'policy.md').symlink_to(shared / 'policy.md')
+        (docs / 'loop').symlink_to(tmp_path, target_is_directory=True)
+        
+        found = {path.relative_to(tmp_path).as_posix() for path in processor._get_all_files(tmp_path)}
+        
+        assert found == {'shared/policy.md', 'docs/policy.md'}
+
+
+class TestDocumentProcessorCapability:
+    
+    @pytest.fixture
+    def processor(self):
+        return DocumentProcessor()
+    
+    @pytest.mark.parametrize("path,capability", [
+        ("Capabilities/OTP_EKYC/flow.md", "EKYC"),
+        ("docs/pannsdl-otp/limits.md", "PANNSDL"),
+        ("Verification/EKYC/steps.md", "VERIFICATION"),
+        ("Capabilities/Bureau/rules.md", "BUREAU"),
+        ("CommonPrompts/intro.md", "COMMON"),
+    ])
+    def test_indicators_follow_priority_order(self, processor, path, capability):
+        """The first path part with an indicator wins; within a part EKYC > PANNSDL > OTP > VERIFICATION."""
+        assert processor._extract_capability_from_path(Path(path)) == capability
+
+
+class TestDocumentProcessorReading:
+    
+    @pytest.fixture
+    def processor(self):
+        return DocumentProcessor()
+    
+    def test_large_file_is_read_through_mmap(self, processor, tmp_path):
+        """Files of at least _MMAP_THRESHOLD bytes are decoded from a memory map."""
+        text = "Vérification du client. " * (_MMAP_THRESHOLD // 20)
+        path = tmp_path / 'large.txt'
+        path.write_text(text, encoding='utf-8')
+        
+        with patch('core.database.document_processor.mmap.mmap', wraps=mmap.mmap) as mapped:
+            assert processor._read_file(path) == text
+        
+        mapped.assert_called_once()
+    
+    def test_small_file_is_read_without_mmap(self, processor, tmp_path):
+        """Small files use a plain read."""
+        path = tmp_path / 'small.txt'
+        path.write_text("A short but valid document.", encoding='utf-8')
+        
+        with patch('core.database.document_processor.mmap.mmap', wraps=mmap.mmap) as mapped:
+            assert processor._read_file(path) == "A short but valid document."
+        
+        mapped.assert_not_called()
+    
+    def test_non_utf8_file_falls_back_to_latin1(self, processor, tmp_path):
+        """Bytes that are not valid UTF-8 are decoded as latin-1."""
+        path = tmp_path / 'legacy.txt'
+        path.write_bytes('Café résumé for the applicant'.encode('latin-1'))
+        
+        assert processor._read_file(path) == 'Café résumé for the applicant'
+    
+    def test_large_non_utf8_file_falls_back_to_latin1(self, processor, tmp_path):
+        """The latin-1 fallback also applies on the mmap path."""
+        text = "Café résumé. " * (_MMAP_THRESHOLD // 10)
+        path = tmp_path / 'legacy_large.txt'
+        path.write_bytes(text.encode('latin-1'))
+        
+        assert processor._read_file(path) == text
+    
+    def test_line_endings_are_translated_before_sizing(self, processor, tmp_path):
+        """CRLF files read like a text-mode open, so file_size does not count carriage returns."""
+        path = tmp_path / 'windows.md'
+        path.write_bytes(b"Loan terms apply.\r\nRepay monthly.\r\n")
+        
+        content = processor._read_file(path)
+        chunks = processor._chunk_content(content, str(path), "GENERAL")
+        
+        assert content == "Loan terms apply.\nRepay monthly.\n"
+        assert chunks[0]['metadata']['file_size'] == len(content)
+    
+    def test_very_short_file_is_skipped(self, processor, tmp_path):
+        """Files with under 10 non-whitespace characters return None."""
+        path = tmp_path / 'tiny.txt'
+        path.write_text("  ok  \n")
+        
+        assert processor._read_file(path) is None
@@ -2,21 +2,37 @@
 Integration tests for dynamic context API endpoints.
 """
 
+import asyncio
+import httpx
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, AsyncMock, patch
-import json
+from unittest.mock import Mock, AsyncMock
+import orjson
 
 # Import the FastAPI app
 from main import app
 
 
+_OK_VALIDATION = {'valid': True, 'errors': [], 'warnings': []}
+
+
+def _json(response):
+    """Decode a TestClient response body with orjson."""
+    return orjson.loads(response.content)
+
+
 class TestDynamicContextAPI:
     
     @pytest.fixture
     def client(self):
         return TestClient(app)
     
+    @pytest_asyncio.fixture
+    async def aclient(self):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    
     @pytest.fixture
     def mock_dynamic_service(self):
         """Mock the dynamic context service."""
@@ -24,6 +40,7 @@ class TestDynamicContextAPI:
         mock.validate_source = AsyncMock()
         mock.process_dynamic_content = AsyncMock()
         mock.get_processing_status = Mock()
+        mock.await_task = AsyncMock()
         mock.get_all_processing_tasks = Mock()
         mock.cleanup_completed_tasks = Mock()
         mock.file_upload_handler = Mock()
@@ -31,31 +48,104 @@ class TestDynamicContextAPI:
         mock.github_processor = Mock()
         return mock
     
-    def test_upload_files_endpoint_success(self, client, mock_dynamic_service):
-        """Test successful file upload processing."""
+    @pytest.fixture(autouse=True)
+    def _patch_service(self, monkeypatch, mock_dynamic_service):
+        """Route the app's dynamic context service to the test's mock."""
+        monkeypatch.setattr('main.dynamic_context_service', mock_dynamic_service)
+    
+    @pytest.mark.parametrize("endpoint,payload,task_id,source_type,message_fragment", [
+        (
+            "/api/dynamic-context/upload",
+            {"files": [{
+                "filename": "test.txt",
+                "content_type": "text/plain",
+                "content": "VGVzdCBjb250ZW50"  # base64 encoded "Test content"
+            }]},
+            "task_123", "upload", "Started processing 1 uploaded files"
+        ),
+        (
+            "/api/dynamic-context/url",
+            {"url": "https://example.com/article"},
+            "task_456", "url", "https://example.com/article"
+        ),
+        (
+            "/api/dynamic-context/github",
+            {"repo_url": "https://github.com/user/repo"},
+            "task_789", "github", "https://github.com/user/repo"
+        ),
+    ])
+    def test_submit_endpoint_success(self, endpoint, payload, task_id, source_type,
+                                     message_fragment, client, mock_dynamic_service):
+        """Test successful submission to the upload, URL and GitHub endpoints."""
         # Mock validation and processing
-        mock_dynamic_service.validate_source.return_value = {'valid': True, 'errors': [], 'warnings': []}
-        mock_dynamic_service.process_dynamic_content.return_value = 'task_123'
-        
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.post(
-                "/api/dynamic-context/upload",
-                json={
-                    "files": [
-                        {
-                            "filename": "test.txt",
-                            "content_type": "text/plain",
-                            "content": "VGVzdCBjb250ZW50"  # base64 encoded "Test content"
-                        }
-                    ]
-                }
-            )
+        mock_dynamic_service.validate_source.return_value = _OK_VALIDATION
+        mock_dynamic_service.process_dynamic_content.return_value = task_id
+        
+        response = client.post(endpoint, json=payload)
         
         assert response.status_code == 200
-        data = response.json()
-        assert data["task_id"] == "task_123"
+        data = _json(response)
+        assert data["task_id"] == task_id
+        assert data["source_type"] == source_type
+        assert message_fragment in data["message"]
+    
+    def test_upload_multipart_endpoint_success(self, client, mock_dynamic_service):
+        """Test successful multipart file upload processing."""
+        mock_dynamic_service.validate_source.return_value = _OK_VALIDATION
+        mock_dynamic_service.process_dynamic_content.return_value = 'task_124'
+        
+        response = client.post(
+            "/api/dynamic-context/upload/multipart",
+            files=[("files", ("test.txt", b"Test content", "text/plain"))]
+        )
+        
+        assert response.status_code == 200
+        data = _json(response)
+        assert data["task_id"] == "task_124"
         assert data["source_type"] == "upload"
-        assert "Started processing 1 uploaded files" in data["message"]
+        
+        # Raw bytes are handed to the service without base64 encoding
+        files = mock_dynamic_service.process_dynamic_content.call_args[0][1]['files']
+        assert files[0]['content'] == b"Test content"
+        assert files[0]['filename'] == "test.txt"
+    
+    def test_upload_multipart_endpoint_without_content_type(self, client, mock_dynamic_service):
+        """A part without a Content-Type header is typed from its filename, as on the JSON endpoint."""
+        mock_dynamic_service.validate_source.return_value = _OK_VALIDATION
+        mock_dynamic_service.process_dynamic_content.return_value = 'task_125'
+        body = (
+            b'--boundary\r\n'
+            b'Content-Disposition: form-data; name="files"; filename="notes.txt"\r\n'
+            b'\r\n'
+            b'Plain text notes about loan eligibility.\r\n'
+            b'--boundary--\r\n'
+        )
+        
+        response = client.post(
+            "/api/dynamic-context/upload/multipart",
+            content=body,
+            headers={"Content-Type": "multipart/form-data; boundary=boundary"}
+        )
+        
+        assert response.status_code == 200
+        files = mock_dynamic_service.process_dynamic_content.call_args[0][1]['files']
+        assert files[0]['content'] == b"Plain text notes about loan eligibility."
+        assert files[0]['content_type'] == ''
+    
+    def test_upload_multipart_endpoint_read_error(self, client, mock_dynamic_service, monkeypatch):
+        """An upload that cannot be read is rejected with 400, not 500."""
+        handler = Mock()
+        handler.validate_file_stream = AsyncMock(side_effect=OSError("connection reset while reading"))
+        monkeypatch.setattr('main.get_file_upload_handler', lambda: handler)
+        
+        response = client.post(
+            "/api/dynamic-context/upload/multipart",
+            files=[("files", ("test.txt", b"Test content", "text/plain"))]
+        )
+        
+        assert response.status_code == 400
+        assert "Could not read uploaded file" in _json(response)["detail"]
+        mock_dynamic_service.process_dynamic_content.assert_not_called()
     
     def test_upload_files_endpoint_validation_error(self, client, mock_dynamic_service):
         """Test file upload with validation errors."""
@@ -66,40 +156,21 @@ class TestDynamicContextAPI:
             'warnings': []
         }
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.post(
-                "/api/dynamic-context/upload",
-                json={
-                    "files": [
-                        {
-                            "filename": "test.exe",
-                            "content_type": "application/octet-stream",
-                            "content": "malicious content"
-                        }
-                    ]
-                }
-            )
+        response = client.post(
+            "/api/dynamic-context/upload",
+            json={
+                "files": [
+                    {
+                        "filename": "test.exe",
+                        "content_type": "application/octet-stream",
+                        "content": "malicious content"
+                    }
+                ]
+            }
+        )
         
         assert response.status_code == 400
-        assert "File validation failed" in response.json()["detail"]
-    
-    def test_process_url_endpoint_success(self, client, mock_dynamic_service):
-        """Test successful URL processing."""
-        # Mock validation and processing
-        mock_dynamic_service.validate_source.return_value = {'valid': True, 'errors': [], 'warnings': []}
-        mock_dynamic_service.process_dynamic_content.return_value = 'task_456'
-        
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.post(
-                "/api/dynamic-context/url",
-                json={"url": "https://example.com/article"}
-            )
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["task_id"] == "task_456"
-        assert data["source_type"] == "url"
-        assert "https://example.com/article" in data["message"]
+        assert "File validation failed" in _json(response)["detail"]
     
     def test_process_url_endpoint_invalid_url(self, client):
         """Test URL processing with invalid URL."""
@@ -110,24 +181,6 @@ class TestDynamicContextAPI:
         
         assert response.status_code == 422  # Validation error
     
-    def test_process_github_endpoint_success(self, client, mock_dynamic_service):
-        """Test successful GitHub repository processing."""
-        # Mock validation and processing
-        mock_dynamic_service.validate_source.return_value = {'valid': True, 'errors': [], 'warnings': []}
-        mock_dynamic_service.process_dynamic_content.return_value = 'task_789'
-        
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.post(
-                "/api/dynamic-context/github",
-                json={"repo_url": "https://github.com/user/repo"}
-            )
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["task_id"] == "task_789"
-        assert data["source_type"] == "github"
-        assert "https://github.com/user/repo" in data["message"]
-    
     def test_process_github_endpoint_invalid_url(self, client):
         """Test GitHub processing with invalid repository URL."""
         response = client.post(
@@ -157,24 +210,45 @@ class TestDynamicContextAPI:
         
         mock_dynamic_service.get_processing_status.return_value = mock_result
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.get("/api/dynamic-context/status/task_123")
+        response = client.get("/api/dynamic-context/status/task_123")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["task_id"] == "task_123"
         assert data["status"] == "completed"
         assert "Processing completed successfully" in data["message"]
     
+    def test_get_processing_status_long_poll(self, client, mock_dynamic_service):
+        """Test wait= awaits the task before reporting its status."""
+        from services.dynamic_context_service import ProcessingStatus, ProcessingResult
+        
+        mock_dynamic_service.get_processing_status.return_value = ProcessingResult(
+            task_id="task_123",
+            status=ProcessingStatus.COMPLETED,
+            documents_processed=1,
+            chunks_created=3,
+            vector_embeddings=3,
+            memory_items_stored=1,
+            errors=[],
+            processing_time=5.2,
+            source_type="upload",
+            source_identifier="test.txt"
+        )
+        
+        response = client.get("/api/dynamic-context/status/task_123", params={"wait": 5})
+        
+        assert response.status_code == 200
+        assert _json(response)["status"] == "completed"
+        mock_dynamic_service.await_task.assert_awaited_once_with("task_123")
+    
     def test_get_processing_status_not_found(self, client, mock_dynamic_service):
         """Test getting status for non-existent task."""
         mock_dynamic_service.get_processing_status.return_value = None
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.get("/api/dynamic-context/status/nonexistent")
+        response = client.get("/api/dynamic-context/status/nonexistent")
         
         assert response.status_code == 404
-        assert "Task not found" in response.json()["detail"]
+        assert "Task not found" in _json(response)["detail"]
     
     def test_get_supported_types_endpoint(self, client, mock_dynamic_service):
         """Test getting supported content types."""
@@ -200,11 +274,10 @@ class TestDynamicContextAPI:
         mock_dynamic_service.url_content_extractor = mock_url_extractor
         mock_dynamic_service.github_processor = mock_github_processor
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.get("/api/dynamic-context/supported-types")
+        response = client.get("/api/dynamic-context/supported-types")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "file_types" in data
         assert "url_types" in data
         assert "github_extensions" in data
@@ -218,15 +291,14 @@ class TestDynamicContextAPI:
             'warnings': ['Minor warning']
         }
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.post(
-                "/api/dynamic-context/validate",
-                params={"source_type": "url"},
-                json={"url": "https://example.com"}
-            )
+        response = client.post(
+            "/api/dynamic-context/validate",
+            params={"source_type": "url"},
+            json={"url": "https://example.com"}
+        )
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["valid"] is True
         assert len(data["warnings"]) == 1
     
@@ -239,26 +311,25 @@ class TestDynamicContextAPI:
         )
         
         assert response.status_code == 400
-        assert "Invalid source type" in response.json()["detail"]
+        assert "Invalid source type" in _json(response)["detail"]
     
     def test_batch_processing_endpoint(self, client, mock_dynamic_service):
         """Test batch processing endpoint."""
-        mock_dynamic_service.validate_source.return_value = {'valid': True, 'errors': [], 'warnings': []}
+        mock_dynamic_service.validate_source.return_value = _OK_VALIDATION
         mock_dynamic_service.process_dynamic_content.side_effect = ['task_1', 'task_2']
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.post(
-                "/api/dynamic-context/batch",
-                json={
-                    "sources": [
-                        {"type": "url", "url": "https://example1.com"},
-                        {"type": "url", "url": "https://example2.com"}
-                    ]
-                }
-            )
+        response = client.post(
+            "/api/dynamic-context/batch",
+            json={
+                "sources": [
+                    {"type": "url", "url": "https://example1.com"},
+                    {"type": "url", "url": "https://example2.com"}
+                ]
+            }
+        )
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert len(data["task_ids"]) == 2
         assert "batch_" in data["batch_id"]
         assert "Started batch processing of 2 sources" in data["message"]
@@ -291,11 +362,10 @@ class TestDynamicContextAPI:
         
         mock_dynamic_service.get_all_processing_tasks.return_value = mock_tasks
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.get("/api/dynamic-context/stats")
+        response = client.get("/api/dynamic-context/stats")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["total_tasks"] == 3
         assert data["active_tasks"] == 1  # Only extracting task
         assert data["completed_tasks"] == 1
@@ -305,17 +375,46 @@ class TestDynamicContextAPI:
     
     def test_cleanup_old_tasks_endpoint(self, client, mock_dynamic_service):
         """Test cleanup endpoint."""
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.delete("/api/dynamic-context/cleanup")
+        response = client.delete("/api/dynamic-context/cleanup")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "Old tasks cleaned up successfully" in data["message"]
         assert "timestamp" in data
         
         # Verify cleanup was called
         mock_dynamic_service.cleanup_completed_tasks.assert_called_once_with(max_age_hours=24)
     
+    async def test_admin_endpoints_concurrent(self, aclient, mock_dynamic_service):
+        """Test cleanup, stats and supported-types endpoints issued concurrently."""
+        mock_dynamic_service.get_all_processing_tasks.return_value = {}
+        mock_dynamic_service.file_upload_handler.get_supported_types.return_value = {
+            'text/plain': 'Plain text files'
+        }
+        mock_url_extractor = Mock()
+        mock_url_extractor.get_supported_content_types.return_value = {'text/html': 'HTML pages'}
+        mock_url_extractor.__aenter__ = AsyncMock(return_value=mock_url_extractor)
+        mock_url_extractor.__aexit__ = AsyncMock(return_value=None)
+        mock_dynamic_service.url_content_extractor = mock_url_extractor
+        mock_dynamic_service.github_processor.get_supported_extensions.return_value = {'.md'}
+        
+        cleanup, stats, supported = await asyncio.gather(
+            aclient.delete("/api/dynamic-context/cleanup"),
+            aclient.get("/api/dynamic-context/stats"),
+            aclient.get("/api/dynamic-context/supported-types")
+        )
+        
+        assert cleanup.status_code == 200
+        assert "Old tasks cleaned up successfully" in _json(cleanup)["message"]
+        mock_dynamic_service.cleanup_completed_tasks.assert_called_once_with(max_age_hours=24)
+        
+        assert stats.status_code == 200
+        assert _json(stats)["total_tasks"] == 0
+        assert _json(stats)["system_health"] == "healthy"
+        
+        assert supported.status_code == 200
+        assert _json(supported)["file_types"]["text/plain"] == "Plain text files"
+    
     def test_request_validation_errors(self, client):
         """Test various request validation errors."""
         # Test empty files list
@@ -357,22 +456,21 @@ class TestDynamicContextAPI:
         # Mock service error
         mock_dynamic_service.validate_source.side_effect = Exception("Service error")
         
-        with patch('main.dynamic_context_service', mock_dynamic_service):
-            response = client.post(
-                "/api/dynamic-context/upload",
-                json={
-                    "files": [
-                        {
-                            "filename": "test.txt",
-                            "content_type": "text/plain",
-                            "content": "content"
-                        }
-                    ]
-                }
-            )
+        response = client.post(
+            "/api/dynamic-context/upload",
+            json={
+                "files": [
+                    {
+                        "filename": "test.txt",
+                        "content_type": "text/plain",
+                        "content": "content"
+                    }
+                ]
+            }
+        )
         
         assert response.status_code == 500
-        assert "Service error" in response.json()["detail"]
+        assert "Service error" in _json(response)["detail"]
 
 
 if __name__ == '__main__':
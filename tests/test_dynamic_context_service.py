@@ -0,0 +1,141 @@
+"""
+Unit tests for DynamicContextService vector writes and task tracking.
+"""
+
+import pytest
+import asyncio
+from unittest.mock import Mock
+
+pytest.importorskip("chromadb")
+pytest.importorskip("models.dynamic_context_models")
+
+from services.dynamic_context_service import DynamicContextService
+
+
+class FakeVectorService:
+    """Records _add_document_batch calls and how many overlap."""
+    
+    def __init__(self, error: Exception = None, delay: float = 0.0):
+        self.batches = []
+        self.error = error
+        self.delay = delay
+        self.inflight = 0
+        self.max_inflight = 0
+    
+    async def _add_document_batch(self, documents, embeddings=None):
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+            self.batches.append(list(documents))
+        finally:
+            self.inflight -= 1
+
+
+def _docs(source: str, count: int):
+    return [{'content': f"{source} chunk {i}", 'source': source, 'chunk_id': i} for i in range(count)]
+
+
+def _make_service(vector_service: FakeVectorService) -> DynamicContextService:
+    return DynamicContextService(
+        document_processor=Mock(),
+        vector_service=vector_service,
+        memory_manager=Mock()
+    )
+
+
+class TestDynamicContextServiceVectorWrites:
+    
+    async def test_concurrent_writes_are_coalesced(self):
+        """Concurrent _add_to_vector_store calls share one _add_document_batch call."""
+        vector_service = FakeVectorService()
+        service = _make_service(vector_service)
+        
+        await asyncio.gather(*(service._add_to_vector_store(_docs(f"source-{n}", 3)) for n in range(3)))
+        
+        assert len(vector_service.batches) == 1
+        assert len(vector_service.batches[0]) == 9
+        await service.close()
+    
+    async def test_write_error_reaches_every_waiter(self):
+        """A failed batch write is raised in every caller whose chunks were in it."""
+        vector_service = FakeVectorService(error=RuntimeError("vector store down"))
+        service = _make_service(vector_service)
+        
+        results = await asyncio.gather(
+            *(service._add_to_vector_store(_docs(f"source-{n}", 2)) for n in range(3)),
+            return_exceptions=True
+        )
+        
+        assert len(results) == 3
+        assert all(isinstance(result, RuntimeError) for result in results)
+        await service.close()
+    
+    async def test_batches_are_split_with_bounded_concurrency(self):
+        """A coalesced batch is written as EMBED_BATCH_SIZE sub-batches, at most MAX_INFLIGHT_EMBED_BATCHES at a time."""
+        vector_service = FakeVectorService(delay=0.01)
+        service = _make_service(vector_service)
+        
+        docs = _docs("large-source", service.EMBED_BATCH_SIZE * (service.MAX_INFLIGHT_EMBED_BATCHES + 2))
+        await service._add_to_vector_store(docs)
+        
+        assert len(vector_service.batches) == service.MAX_INFLIGHT_EMBED_BATCHES + 2
+        assert all(len(batch) == service.EMBED_BATCH_SIZE for batch in vector_service.batches)
+        assert vector_service.max_inflight == service.MAX_INFLIGHT_EMBED_BATCHES
+        await service.close()
+    
+    async def test_flush_waits_for_queued_writes(self):
+        """flush() returns only after every queued chunk has been written."""
+        vector_service = FakeVectorService(delay=0.01)
+        service = _make_service(vector_service)
+        
+        writers = [asyncio.create_task(service._add_to_vector_store(_docs(f"source-{n}", 2))) for n in range(2)]
+        await asyncio.sleep(0)
+        await service.flush()
+        
+        assert sum(len(batch) for batch in vector_service.batches) == 4
+        assert all(writer.done() for writer in writers)
+        await service.close()
+    
+    async def test_close_drains_queue_and_stops_writer(self):
+        """close() writes whatever is queued, then cancels the batch writer task."""
+        vector_service = FakeVectorService(delay=0.01)
+        service = _make_service(vector_service)
+        
+        writer = asyncio.create_task(service._add_to_vector_store(_docs("source", 2)))
+        await asyncio.sleep(0)
+        batch_writer = service._batch_writer
+        
+        await service.close()
+        
+        assert writer.done() and writer.exception() is None
+        assert batch_writer.cancelled()
+        assert service._batch_writer is None
+        assert len(vector_service.batches) == 1
+
+
+class TestDynamicContextServiceTasks:
+    
+    async def test_await_task_returns_final_result(self):
+        """await_task waits for the task and returns its processing result."""
+        service = _make_service(FakeVectorService())
+        result = Mock()
+        service.processing_tasks['task-1'] = result
+        service._tasks['task-1'] = asyncio.create_task(asyncio.sleep(0.01))
+        
+        assert await service.await_task('task-1') is result
+        assert await service.await_task('unknown') is None
+    
+    async def test_await_task_timeout_does_not_cancel_processing(self):
+        """A caller's timeout around await_task leaves the processing task running."""
+        service = _make_service(FakeVectorService())
+        task = asyncio.create_task(asyncio.sleep(0.05))
+        service._tasks['task-1'] = task
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(service.await_task('task-1'), 0.001)
+        
+        assert not task.cancelled()
+        await task
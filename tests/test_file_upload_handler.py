@@ -4,7 +4,7 @@ Unit tests for FileUploadHandler service.
 
 import pytest
 import asyncio
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
 from core.processing.file_upload_handler import FileUploadHandler
 
 
@@ -30,7 +30,6 @@ class TestFileUploadHandler:
             'content': b'# Test Document\n\nThis is a **markdown** document with [links](http://example.com).\n\n```python\nprint("code")\n```'
         }
     
-    @pytest.mark.asyncio
     async def test_validate_file_valid_text(self, handler, sample_text_file):
         """Test validation of valid text file."""
         result = await handler.validate_file(sample_text_file)
@@ -38,7 +37,6 @@ class TestFileUploadHandler:
         assert result['valid'] is True
         assert len(result['errors']) == 0
     
-    @pytest.mark.asyncio
     async def test_validate_file_empty_content(self, handler):
         """Test validation of empty file."""
         empty_file = {
@@ -52,7 +50,6 @@ class TestFileUploadHandler:
         assert result['valid'] is False
         assert 'File is empty' in result['errors']
     
-    @pytest.mark.asyncio
     async def test_validate_file_too_large(self, handler):
         """Test validation of oversized file."""
         large_file = {
@@ -66,7 +63,65 @@ class TestFileUploadHandler:
         assert result['valid'] is False
         assert any('exceeds maximum' in error for error in result['errors'])
     
-    @pytest.mark.asyncio
+    async def test_validate_file_stops_at_first_error(self, handler):
+        """Test validation reports only the first error unless strict."""
+        bad_file = {
+            'filename': 'empty.exe',
+            'content_type': 'application/octet-stream',
+            'content': b''
+        }
+        
+        result = await handler.validate_file(bad_file)
+        assert result['errors'] == ['File is empty']
+        
+        result = await handler.validate_file(bad_file, strict=True)
+        assert result['valid'] is False
+        assert len(result['errors']) == 3
+    
+    async def test_validate_file_stream_rejects_oversize_early(self, handler):
+        """Test streamed validation stops reading once the size limit is exceeded."""
+        chunks_read = []
+        chunk = b'x' * (handler.max_file_size // 2)
+        
+        async def reader():
+            for _ in range(4):
+                chunks_read.append(chunk)
+                yield chunk
+        
+        result, content = await handler.validate_file_stream('large.txt', 'text/plain', None, reader())
+        
+        assert result['valid'] is False
+        assert any('exceeds maximum' in error for error in result['errors'])
+        assert content is None
+        assert len(chunks_read) == 3
+        
+        # A declared size over the limit is rejected without reading
+        result, content = await handler.validate_file_stream('large.txt', 'text/plain', handler.max_file_size + 1, reader())
+        assert result['valid'] is False
+        assert content is None
+    
+    async def test_validate_file_stream_checks_metadata_before_reading(self, handler):
+        """Test unsafe files are rejected from metadata without reading the body."""
+        reader = Mock()
+        reader.read = AsyncMock(return_value=b'')
+        
+        result, content = await handler.validate_file_stream('payload.exe', 'text/plain', 1024, reader)
+        
+        assert result['valid'] is False
+        assert any('unsafe file extension' in error for error in result['errors'])
+        assert content is None
+        reader.read.assert_not_called()
+    
+    async def test_validate_file_stream_valid(self, handler, sample_text_file):
+        """Test streamed validation of a valid file returns its content."""
+        reader = Mock()
+        reader.read = AsyncMock(side_effect=[sample_text_file['content'], b''])
+        
+        result, content = await handler.validate_file_stream('test.txt', 'text/plain', None, reader)
+        
+        assert result['valid'] is True
+        assert content == sample_text_file['content']
+    
     async def test_validate_file_suspicious_extension(self, handler):
         """Test validation of file with suspicious extension."""
         suspicious_file = {
@@ -80,33 +135,30 @@ class TestFileUploadHandler:
         assert result['valid'] is False
         assert any('unsafe file extension' in error for error in result['errors'])
     
-    @pytest.mark.asyncio
     async def test_process_text_file(self, handler, sample_text_file):
         """Test processing of text file."""
         processed = await handler._process_single_file(sample_text_file)
         
         assert processed is not None
-        assert processed['content'] == 'This is a test document with some content for processing.'
-        assert processed['source'] == 'test.txt'
-        assert processed['source_type'] == 'upload'
-        assert processed['content_type'] == 'text/plain'
-        assert processed['metadata']['original_filename'] == 'test.txt'
+        assert processed.content == 'This is a test document with some content for processing.'
+        assert processed.source == 'test.txt'
+        assert processed.source_type == 'upload'
+        assert processed.content_type == 'text/plain'
+        assert processed.metadata['original_filename'] == 'test.txt'
     
-    @pytest.mark.asyncio
     async def test_process_markdown_file(self, handler, sample_markdown_file):
         """Test processing of markdown file."""
         processed = await handler._process_single_file(sample_markdown_file)
         
         assert processed is not None
-        assert 'Test Document' in processed['content']
-        assert 'markdown' in processed['content']
-        assert 'links' in processed['content']
+        assert 'Test Document' in processed.content
+        assert 'markdown' in processed.content
+        assert 'links' in processed.content
         # Check that markdown syntax is cleaned up
-        assert '**' not in processed['content']
-        assert '[' not in processed['content']
-        assert '```' not in processed['content']
+        assert '**' not in processed.content
+        assert '[' not in processed.content
+        assert '```' not in processed.content
     
-    @pytest.mark.asyncio
     async def test_process_multiple_files(self, handler, sample_text_file, sample_markdown_file):
         """Test processing multiple files."""
         files = [sample_text_file, sample_markdown_file]
@@ -114,11 +166,10 @@ class TestFileUploadHandler:
         processed_docs = await handler.process_uploaded_files(files)
         
         assert len(processed_docs) == 2
-        assert all(doc['source_type'] == 'upload' for doc in processed_docs)
-        assert any(doc['source'] == 'test.txt' for doc in processed_docs)
-        assert any(doc['source'] == 'test.md' for doc in processed_docs)
+        assert all(doc.source_type == 'upload' for doc in processed_docs)
+        assert any(doc.source == 'test.txt' for doc in processed_docs)
+        assert any(doc.source == 'test.md' for doc in processed_docs)
     
-    @pytest.mark.asyncio
     async def test_process_too_many_files(self, handler, sample_text_file):
         """Test processing too many files at once."""
         files = [sample_text_file] * (handler.max_files_per_batch + 1)
@@ -126,7 +177,6 @@ class TestFileUploadHandler:
         with pytest.raises(ValueError, match="Too many files"):
             await handler.process_uploaded_files(files)
     
-    @pytest.mark.asyncio
     async def test_process_unsupported_file_type(self, handler):
         """Test processing unsupported file type."""
         unsupported_file = {
@@ -157,7 +207,6 @@ class TestFileUploadHandler:
         assert file_info['supported'] is True
         assert file_info['processor_available'] is True
     
-    @pytest.mark.asyncio
     async def test_text_file_encoding_handling(self, handler):
         """Test handling of different text encodings."""
         # Test UTF-8 with BOM
@@ -168,7 +217,7 @@ class TestFileUploadHandler:
         }
         
         processed = await handler._process_single_file(utf8_bom_file)
-        assert processed['content'] == 'This is UTF-8 with BOM'
+        assert processed.content == 'This is UTF-8 with BOM'
         
         # Test Latin-1 encoding
         latin1_file = {
@@ -178,14 +227,17 @@ class TestFileUploadHandler:
         }
         
         processed = await handler._process_single_file(latin1_file)
-        assert 'Café' in processed['content']
+        assert 'Café' in processed.content
+    
+    def test_extract_text(self, handler):
+        """Test plain text extraction strips a UTF-8 BOM."""
+        assert handler._extract_text(b'\xef\xbb\xbfPlain text body', 'test.txt') == 'Plain text body'
     
-    @pytest.mark.asyncio
-    async def test_markdown_cleanup(self, handler):
+    def test_markdown_cleanup(self, handler):
         """Test markdown syntax cleanup."""
         markdown_content = b'# Header\n\n**Bold** and *italic* text.\n\n[Link](http://example.com)\n\n```code block```\n\n`inline code`'
         
-        result = await handler._process_markdown_file(markdown_content, 'test.md')
+        result = handler._extract_markdown(markdown_content, 'test.md')
         
         # Check that markdown syntax is removed
         assert '#' not in result
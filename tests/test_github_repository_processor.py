@@ -4,20 +4,26 @@ Unit tests for GitHubRepositoryProcessor service.
 
 import pytest
 import asyncio
+from types import MappingProxyType
 from unittest.mock import Mock, AsyncMock, patch
 import aiohttp
 from core.processing.github_repository_processor import GitHubRepositoryProcessor
 
 
+# Error raised by mocked GitHub lookups for a missing repository
+_REPO_NOT_FOUND = ValueError("Repository not found")
+
+
 class TestGitHubRepositoryProcessor:
     
     @pytest.fixture
     def processor(self):
         return GitHubRepositoryProcessor()
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def mock_repo_info(self):
-        return {
+        # Shared across the module, so handed out read-only
+        return MappingProxyType({
             'name': 'test-repo',
             'full_name': 'testuser/test-repo',
             'description': 'A test repository',
@@ -27,11 +33,12 @@ class TestGitHubRepositoryProcessor:
             'updated_at': '2023-01-01T00:00:00Z',
             'default_branch': 'main',
             'topics': ['python', 'testing']
-        }
+        })
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def mock_file_contents(self):
-        return [
+        # Shared across the module, so handed out read-only
+        return tuple(MappingProxyType(item) for item in [
             {
                 'name': 'README.md',
                 'path': 'README.md',
@@ -53,7 +60,7 @@ class TestGitHubRepositoryProcessor:
                 'path': 'docs',
                 'type': 'dir'
             }
-        ]
+        ])
     
     def test_parse_repo_url_valid_urls(self, processor):
         """Test parsing valid GitHub repository URLs."""
@@ -104,6 +111,41 @@ class TestGitHubRepositoryProcessor:
         # All files should be included (under limit)
         assert len(filtered) == len(files)
     
+    def test_filter_documentation_files_limits_large_repos(self, processor):
+        """Test large repositories are cut to the file limit in priority order."""
+        files = [
+            {'name': f'module{i:03d}.py', 'path': f'src/module{i:03d}.py', 'type': 'file'}
+            for i in range(120, 0, -1)
+        ]
+        files += [
+            {'name': 'guide.md', 'path': 'docs/guide.md', 'type': 'file'},
+            {'name': 'README.md', 'path': 'README.md', 'type': 'file'}
+        ]
+        
+        filtered = processor._filter_documentation_files(files)
+        
+        assert len(filtered) == processor.max_files_per_repo
+        assert [f['path'] for f in filtered[:2]] == ['README.md', 'docs/guide.md']
+        regular_paths = [f['path'] for f in filtered[2:]]
+        assert regular_paths == sorted(f['path'] for f in files[:120])[:processor.max_files_per_repo - 2]
+    
+    def test_filter_documentation_files_scores_priority_files_once(self, processor, monkeypatch):
+        """Test only priority files are scored, each distinct path once, and every entry keeps its slot."""
+        files = [
+            {'name': 'README.md', 'path': 'README.md', 'type': 'file', 'size': 100},
+            {'name': 'guide.md', 'path': 'docs/guide.md', 'type': 'file', 'size': 100},
+            {'name': 'huge.md', 'path': 'docs/huge.md', 'type': 'file', 'size': processor.max_file_size + 1},
+            {'name': 'main.py', 'path': 'src/main.py', 'type': 'file', 'size': 100}
+        ]
+        scored = []
+        score = processor._get_file_priority_score
+        monkeypatch.setattr(processor, '_get_file_priority_score', lambda path: scored.append(path) or score(path))
+        
+        filtered = processor._filter_documentation_files(files)
+        
+        assert [f['path'] for f in filtered] == ['README.md', 'docs/guide.md', 'docs/huge.md', 'src/main.py']
+        assert sorted(scored) == ['README.md', 'docs/guide.md', 'docs/huge.md']
+    
     def test_get_file_priority_score(self, processor):
         """Test file priority scoring."""
         # README files should have highest priority (lowest score)
@@ -118,7 +160,7 @@ class TestGitHubRepositoryProcessor:
     
     def test_is_code_file(self, processor):
         """Test code file detection."""
-        code_files = ['main.py', 'app.js', 'Component.tsx', 'Main.java', 'lib.cpp']
+        code_files = ['main.py', 'app.js', 'Component.ts', 'Main.java', 'lib.cpp']
         non_code_files = ['README.md', 'config.json', 'data.csv', 'image.png']
         
         for file_path in code_files:
@@ -153,6 +195,15 @@ class TestGitHubRepositoryProcessor:
         assert decoded.startswith('# File: main.py')
         assert 'print("Hello, World!")' in decoded
     
+    def test_decode_file_content_bom(self, processor):
+        """Test byte-order marks select the encoding and are dropped."""
+        assert processor._decode_file_content(b'\xef\xbb\xbfHello\r\nWorld', 'notes.md') == 'Hello\nWorld'
+        assert processor._decode_file_content('\ufeffCafé'.encode('utf-16-le'), 'notes.md') == 'Café'
+        assert processor._decode_file_content('\ufeffCafé'.encode('utf-16-be'), 'notes.md') == 'Café'
+        
+        # Non-UTF-8 content without a BOM falls back to latin-1
+        assert processor._decode_file_content('Café'.encode('latin-1'), 'notes.txt') == 'Café'
+    
     def test_analyze_file_types(self, processor):
         """Test file type analysis."""
         files = [
@@ -169,30 +220,21 @@ class TestGitHubRepositoryProcessor:
         assert file_types['.md'] == 2
         assert file_types['.json'] == 1
     
-    @pytest.mark.asyncio
     async def test_context_manager(self, processor):
         """Test async context manager functionality."""
         async with processor as proc:
             assert proc.session is not None
             assert isinstance(proc.session, aiohttp.ClientSession)
+            # All requests share the processor's pooled connector
+            assert proc.session.connector is proc._connector
         
         # Session should be closed after context
         assert processor.session is None or processor.session.closed
     
-    @pytest.mark.asyncio
     @patch('aiohttp.ClientSession')
-    async def test_get_repository_info_success(self, mock_session_class, processor, mock_repo_info):
+    async def test_get_repository_info_success(self, mock_session_class, processor, mock_repo_info, mocked_session_factory, mocked_response_factory):
         """Test successful repository info retrieval."""
-        mock_session = Mock()
-        mock_response = Mock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_repo_info)
-        
-        mock_session.get.return_value.__aenter__ = AsyncMock(return_value=mock_response)
-        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=None)
-        mock_session.close = AsyncMock()
-        
-        mock_session_class.return_value = mock_session
+        mock_session_class.return_value = mocked_session_factory(mocked_response_factory(json=mock_repo_info))
         
         async with processor as proc:
             result = await proc._get_repository_info('testuser', 'test-repo')
@@ -203,46 +245,64 @@ class TestGitHubRepositoryProcessor:
         assert result['language'] == 'Python'
         assert result['stars'] == 100
     
-    @pytest.mark.asyncio
     @patch('aiohttp.ClientSession')
-    async def test_get_repository_info_not_found(self, mock_session_class, processor):
-        """Test repository not found error."""
-        mock_session = Mock()
-        mock_response = Mock()
-        mock_response.status = 404
+    async def test_etag_conditional_request(self, mock_session_class, processor, mock_repo_info, mocked_session_factory, mocked_response_factory):
+        """Test repeat API requests revalidate with If-None-Match and reuse the cached payload."""
+        first_response = mocked_response_factory(json=mock_repo_info)
+        first_response.headers = {'ETag': '"abc123"'}
+        not_modified_response = mocked_response_factory(304, json=None)
+        mock_session = mocked_session_factory(first_response, not_modified_response)
+        mock_session_class.return_value = mock_session
         
-        mock_session.get.return_value.__aenter__ = AsyncMock(return_value=mock_response)
-        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=None)
-        mock_session.close = AsyncMock()
+        async with processor as proc:
+            first = await proc._get_repository_info('testuser', 'test-repo')
+            second = await proc._get_repository_info('testuser', 'test-repo')
         
+        assert first == second
+        first_response.json.assert_called_once()
+        not_modified_response.json.assert_not_called()
+        assert mock_session.get.call_args_list[1].kwargs['headers'] == {'If-None-Match': '"abc123"'}
+    
+    @patch('aiohttp.ClientSession')
+    async def test_rate_limiter_respects_retry_after(self, mock_session_class, processor, mock_repo_info, mocked_session_factory, mocked_response_factory):
+        """Test a rate-limited request is retried after the Retry-After delay."""
+        limited_response = mocked_response_factory(403)
+        limited_response.headers = {'Retry-After': '1', 'X-RateLimit-Remaining': '0'}
+        mock_session = mocked_session_factory(limited_response, mocked_response_factory(json=mock_repo_info))
         mock_session_class.return_value = mock_session
         
+        async with processor as proc:
+            proc._rate_limiter.max_wait = 0.05
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            result = await proc._get_repository_info('testuser', 'test-repo')
+            elapsed = loop.time() - started
+        
+        assert result['name'] == 'test-repo'
+        assert mock_session.get.call_count == 2
+        assert elapsed >= 0.04  # call_later may fire up to one clock tick early
+    
+    @patch('aiohttp.ClientSession')
+    async def test_get_repository_info_not_found(self, mock_session_class, processor, mocked_session_factory, mocked_response_factory):
+        """Test repository not found error."""
+        mock_session_class.return_value = mocked_session_factory(mocked_response_factory(404))
+        
         async with processor as proc:
             with pytest.raises(ValueError, match="not found or not accessible"):
                 await proc._get_repository_info('testuser', 'nonexistent-repo')
     
-    @pytest.mark.asyncio
     @patch('aiohttp.ClientSession')
-    async def test_get_repository_contents(self, mock_session_class, processor, mock_file_contents):
+    async def test_get_repository_contents(self, mock_session_class, processor, mock_file_contents, monkeypatch, mocked_session_factory, mocked_response_factory):
         """Test repository contents retrieval."""
-        mock_session = Mock()
-        mock_response = Mock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_file_contents)
-        
-        mock_session.get.return_value.__aenter__ = AsyncMock(return_value=mock_response)
-        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=None)
-        mock_session.close = AsyncMock()
-        
-        mock_session_class.return_value = mock_session
+        mock_session_class.return_value = mocked_session_factory(mocked_response_factory(json=mock_file_contents))
         
         async with processor as proc:
             # Mock recursive call for directory
-            with patch.object(proc, '_get_repository_contents', side_effect=[
+            monkeypatch.setattr(proc, '_get_repository_contents', AsyncMock(side_effect=[
                 mock_file_contents,  # Initial call
                 [{'name': 'guide.md', 'path': 'docs/guide.md', 'type': 'file', 'size': 500}]  # Recursive call
-            ]):
-                result = await proc._get_repository_contents('testuser', 'test-repo')
+            ]))
+            result = await proc._get_repository_contents('testuser', 'test-repo')
         
         # Should include files from root and subdirectory
         assert len(result) >= 2
@@ -250,21 +310,51 @@ class TestGitHubRepositoryProcessor:
         assert 'README.md' in file_names
         assert 'main.py' in file_names
     
-    @pytest.mark.asyncio
     @patch('aiohttp.ClientSession')
-    async def test_get_file_content_success(self, mock_session_class, processor):
-        """Test successful file content retrieval."""
-        mock_session = Mock()
-        mock_response = Mock()
-        mock_response.status = 200
-        mock_response.read = AsyncMock(return_value=b'# Test README\n\nThis is a test file.')
+    async def test_get_repository_contents_parallel(self, mock_session_class, processor, mocked_response_factory):
+        """Test sibling directories are listed concurrently."""
+        base = 'https://api.github.com/repos/testuser/test-repo/contents/'
+        listings = {base: [{'name': name, 'path': name, 'type': 'dir'} for name in ('docs', 'guides', 'examples')]}
+        for name in ('docs', 'guides', 'examples'):
+            listings[base + name] = [{'name': 'index.md', 'path': f'{name}/index.md', 'type': 'file'}]
+        
+        in_flight = 0
+        peak_in_flight = 0
+        
+        class _Request:
+            def __init__(self, url):
+                self.url = url
+            
+            async def __aenter__(self):
+                nonlocal in_flight, peak_in_flight
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                return mocked_response_factory(json=listings[self.url])
+            
+            async def __aexit__(self, *exc_info):
+                return None
         
-        mock_session.get.return_value.__aenter__ = AsyncMock(return_value=mock_response)
-        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=None)
+        mock_session = Mock()
+        mock_session.get = Mock(side_effect=lambda url, headers=None: _Request(url))
         mock_session.close = AsyncMock()
-        
         mock_session_class.return_value = mock_session
         
+        async with processor as proc:
+            result = await proc._get_repository_contents('testuser', 'test-repo')
+        
+        assert sorted(f['path'] for f in result) == ['docs/index.md', 'examples/index.md', 'guides/index.md']
+        assert mock_session.get.call_count == 4
+        assert peak_in_flight > 1
+    
+    @patch('aiohttp.ClientSession')
+    async def test_get_file_content_success(self, mock_session_class, processor, mocked_session_factory, mocked_response_factory):
+        """Test successful file content retrieval."""
+        mock_session_class.return_value = mocked_session_factory(
+            mocked_response_factory(read=b'# Test README\n\nThis is a test file.')
+        )
+        
         file_info = {
             'path': 'README.md',
             'download_url': 'https://raw.githubusercontent.com/testuser/test-repo/main/README.md'
@@ -277,23 +367,17 @@ class TestGitHubRepositoryProcessor:
         assert '# Test README' in result
         assert 'This is a test file.' in result
     
-    @pytest.mark.asyncio
-    async def test_validate_repository_url_valid(self, processor):
-        """Test validation of valid repository URL."""
-        with patch.object(processor, '_get_repository_info') as mock_get_info:
-            mock_get_info.return_value = {'name': 'test-repo'}
-            
-            result = await processor.validate_repository_url('https://github.com/testuser/test-repo')
-            assert result is True
-    
-    @pytest.mark.asyncio
-    async def test_validate_repository_url_invalid(self, processor):
-        """Test validation of invalid repository URL."""
-        with patch.object(processor, '_get_repository_info') as mock_get_info:
-            mock_get_info.side_effect = ValueError("Repository not found")
-            
-            result = await processor.validate_repository_url('https://github.com/testuser/nonexistent')
-            assert result is False
+    @pytest.mark.parametrize("repo_info_result, url, expected_valid", [
+        ({'name': 'test-repo'}, 'https://github.com/testuser/test-repo', True),
+        (_REPO_NOT_FOUND, 'https://github.com/testuser/nonexistent', False)
+    ], ids=['valid', 'invalid'])
+    async def test_validate_repository_url(self, processor, monkeypatch, repo_info_result, url, expected_valid):
+        """Test validation of valid and invalid repository URLs."""
+        # An exception in side_effect is raised, anything else is returned
+        monkeypatch.setattr(processor, '_get_repository_info', AsyncMock(side_effect=[repo_info_result]))
+        
+        result = await processor.validate_repository_url(url)
+        assert result is expected_valid
     
     def test_supported_extensions(self, processor):
         """Test getting supported file extensions."""
@@ -305,30 +389,13 @@ class TestGitHubRepositoryProcessor:
         assert '.json' in extensions
         assert isinstance(extensions, set)
     
-    @pytest.mark.asyncio
     @patch('aiohttp.ClientSession')
-    async def test_get_repository_summary(self, mock_session_class, processor, mock_repo_info, mock_file_contents):
+    async def test_get_repository_summary(self, mock_session_class, processor, mock_repo_info, mock_file_contents, mocked_session_factory, mocked_response_factory):
         """Test repository summary generation."""
-        mock_session = Mock()
-        
-        # Mock repository info response
-        mock_repo_response = Mock()
-        mock_repo_response.status = 200
-        mock_repo_response.json = AsyncMock(return_value=mock_repo_info)
-        
-        # Mock contents response
-        mock_contents_response = Mock()
-        mock_contents_response.status = 200
-        mock_contents_response.json = AsyncMock(return_value=mock_file_contents)
-        
-        mock_session.get.return_value.__aenter__ = AsyncMock(side_effect=[
-            mock_repo_response,  # Repository info call
-            mock_contents_response  # Contents call
-        ])
-        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=None)
-        mock_session.close = AsyncMock()
-        
-        mock_session_class.return_value = mock_session
+        mock_session_class.return_value = mocked_session_factory(
+            mocked_response_factory(json=mock_repo_info),  # Repository info call
+            mocked_response_factory(json=mock_file_contents)  # Contents call
+        )
         
         async with processor as proc:
             summary = await proc.get_repository_summary('https://github.com/testuser/test-repo')
@@ -343,42 +410,22 @@ class TestGitHubRepositoryProcessor:
         assert summary['total_files'] >= 0
         assert summary['documentation_files'] >= 0
     
-    @pytest.mark.asyncio
     @patch('aiohttp.ClientSession')
-    async def test_process_repository_full_workflow(self, mock_session_class, processor, mock_repo_info):
+    async def test_process_repository_full_workflow(self, mock_session_class, processor, mock_repo_info, mocked_session_factory, mocked_response_factory):
         """Test complete repository processing workflow."""
-        mock_session = Mock()
-        
-        # Mock all required responses
-        mock_repo_response = Mock()
-        mock_repo_response.status = 200
-        mock_repo_response.json = AsyncMock(return_value=mock_repo_info)
-        
-        mock_contents_response = Mock()
-        mock_contents_response.status = 200
-        mock_contents_response.json = AsyncMock(return_value=[
-            {
-                'name': 'README.md',
-                'path': 'README.md',
-                'type': 'file',
-                'size': 500,
-                'download_url': 'https://raw.githubusercontent.com/testuser/test-repo/main/README.md'
-            }
-        ])
-        
-        mock_file_response = Mock()
-        mock_file_response.status = 200
-        mock_file_response.read = AsyncMock(return_value=b'# Test Repository\n\nThis is a test repository.')
-        
-        mock_session.get.return_value.__aenter__ = AsyncMock(side_effect=[
-            mock_repo_response,  # Repository info
-            mock_contents_response,  # Contents
-            mock_file_response  # File content
-        ])
-        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=None)
-        mock_session.close = AsyncMock()
-        
-        mock_session_class.return_value = mock_session
+        mock_session_class.return_value = mocked_session_factory(
+            mocked_response_factory(json=mock_repo_info),  # Repository info
+            mocked_response_factory(json=[  # Contents
+                {
+                    'name': 'README.md',
+                    'path': 'README.md',
+                    'type': 'file',
+                    'size': 500,
+                    'download_url': 'https://raw.githubusercontent.com/testuser/test-repo/main/README.md'
+                }
+            ]),
+            mocked_response_factory(read=b'# Test Repository\n\nThis is a test repository.')  # File content
+        )
         
         async with processor as proc:
             result = await proc.process_repository('https://github.com/testuser/test-repo')
@@ -391,6 +438,42 @@ class TestGitHubRepositoryProcessor:
         assert 'Test Repository' in doc['content']
         assert doc['metadata']['repository_name'] == 'test-repo'
         assert doc['metadata']['file_path'] == 'README.md'
+    
+    @patch('aiohttp.ClientSession')
+    async def test_process_repository_files_concurrent(self, mock_session_class, processor, monkeypatch, mocked_session_factory):
+        """Test file downloads overlap and results keep file order."""
+        mock_session_class.return_value = mocked_session_factory()
+        repo_info = {
+            'name': 'test-repo',
+            'full_name': 'testuser/test-repo',
+            'description': 'A test repository',
+            'language': 'Python',
+            'stars': 100,
+            'topics': []
+        }
+        files = [
+            {'name': f'doc{i}.md', 'path': f'docs/doc{i}.md', 'type': 'file', 'size': 100}
+            for i in range(5)
+        ]
+        
+        in_flight = 0
+        peak_in_flight = 0
+        
+        async def fake_get_file_content(owner, repo, file_info):
+            nonlocal in_flight, peak_in_flight
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return f"# {file_info['name']}"
+        
+        async with processor as proc:
+            monkeypatch.setattr(proc, '_get_file_content', fake_get_file_content)
+            result = await proc._process_repository_files('testuser', 'test-repo', files, repo_info)
+        
+        assert [doc['file_path'] for doc in result] == [f['path'] for f in files]
+        assert peak_in_flight > 1
+        assert len({doc['metadata']['extraction_timestamp'] for doc in result}) == 1
 
 
 if __name__ == '__main__':
@@ -9,6 +9,20 @@ import aiohttp
 from core.processing.url_content_extractor import URLContentExtractor
 
 
+def _streamed_body(*chunks: bytes) -> Mock:
+    """Build a mocked response.content whose iter_chunked() yields the given chunks."""
+    content = Mock()
+    content.consumed = 0
+    
+    async def iter_chunked(size):
+        for chunk in chunks:
+            content.consumed += 1
+            yield chunk
+    
+    content.iter_chunked = iter_chunked
+    return content
+
+
 class TestURLContentExtractor:
     
     @pytest.fixture
@@ -22,7 +36,7 @@ class TestURLContentExtractor:
         mock.status = 200
         mock.headers = {'content-type': 'text/html; charset=utf-8'}
         mock.url = 'https://example.com'
-        mock.read = AsyncMock(return_value=b'<html><head><title>Test Page</title></head><body><h1>Test Content</h1><p>This is test content.</p></body></html>')
+        mock.content = _streamed_body(b'<html><head><title>Test Page</title></head><body><h1>Test Content</h1><p>This is test content.</p></body></html>')
         return mock
     
     @pytest.fixture
@@ -38,7 +52,7 @@ class TestURLContentExtractor:
         mock.close = AsyncMock()
         return mock
     
-    def test_url_validation_valid_urls(self, extractor):
+    async def test_url_validation_valid_urls(self, extractor):
         """Test validation of valid URLs."""
         valid_urls = [
             'https://example.com',
@@ -47,9 +61,9 @@ class TestURLContentExtractor:
         ]
         
         for url in valid_urls:
-            assert asyncio.run(extractor.validate_url(url)) is True
+            assert await extractor.validate_url(url) is True
     
-    def test_url_validation_invalid_urls(self, extractor):
+    async def test_url_validation_invalid_urls(self, extractor):
         """Test validation of invalid URLs."""
         invalid_urls = [
             'ftp://example.com',
@@ -61,9 +75,8 @@ class TestURLContentExtractor:
         ]
         
         for url in invalid_urls:
-            assert asyncio.run(extractor.validate_url(url)) is False
+            assert await extractor.validate_url(url) is False
     
-    @pytest.mark.asyncio
     async def test_html_content_extraction(self, extractor):
         """Test HTML content extraction."""
         html_content = b'<html><head><title>Test Page</title></head><body><h1>Header</h1><p>This is test content.</p><script>alert("test");</script></body></html>'
@@ -82,7 +95,6 @@ class TestURLContentExtractor:
         assert result['title'] == 'Test Page'
         assert result['method'] == 'html_parser'
     
-    @pytest.mark.asyncio
     async def test_text_content_extraction(self, extractor):
         """Test plain text content extraction."""
         text_content = b'This is plain text content.\n\nWith multiple paragraphs.'
@@ -98,7 +110,6 @@ class TestURLContentExtractor:
         assert 'With multiple paragraphs.' in result['text']
         assert result['method'] == 'text_parser'
     
-    @pytest.mark.asyncio
     async def test_content_decoding(self, extractor):
         """Test content decoding with different encodings."""
         # UTF-8 content
@@ -111,6 +122,14 @@ class TestURLContentExtractor:
         decoded = extractor._decode_content(latin1_content)
         assert 'Café' in decoded
     
+    def test_content_decoding_declared_charset(self, extractor):
+        """Test the charset declared in Content-Type takes precedence."""
+        cp1251_content = 'Привет, мир'.encode('cp1251')
+        assert extractor._decode_content(cp1251_content, 'windows-1251') == 'Привет, мир'
+        
+        # An unknown declared charset falls back to detection
+        assert extractor._decode_content('Hello'.encode('utf-8'), 'x-unknown') == 'Hello'
+    
     def test_text_cleaning(self, extractor):
         """Test text cleaning functionality."""
         dirty_text = """
@@ -140,25 +159,28 @@ class TestURLContentExtractor:
         assert 'This is messy text.' in cleaned
         assert 'With excessive whitespace.' in cleaned
     
-    @pytest.mark.asyncio
     async def test_rate_limiting(self, extractor):
         """Test rate limiting functionality."""
-        extractor.request_delay = 0.1  # Short delay for testing
-        
-        start_time = asyncio.get_event_loop().time()
+        extractor.requests_per_second = 10  # One token every 0.1s
+        extractor.burst_size = 3
+        loop = asyncio.get_running_loop()
         
-        # First request should not be delayed
-        await extractor._apply_rate_limit()
-        first_time = asyncio.get_event_loop().time()
+        # A full bucket lets a burst through concurrently without delay
+        start_time = loop.time()
+        await asyncio.gather(*(extractor._apply_rate_limit() for _ in range(extractor.burst_size)))
+        burst_time = loop.time()
+        assert (burst_time - start_time) < 0.05
         
-        # Second request should be delayed
-        await extractor._apply_rate_limit()
-        second_time = asyncio.get_event_loop().time()
-        
-        # Check that delay was applied
-        assert (second_time - first_time) >= extractor.request_delay
+        # Once the bucket is empty, concurrent requests each wait for their own refill
+        await asyncio.gather(*(extractor._apply_rate_limit() for _ in range(2)))
+        refill_time = loop.time()
+        assert (refill_time - burst_time) >= 0.19
+    
+    def test_rate_limit_defaults(self, extractor):
+        """Outbound fetches default to one request per second with no burst."""
+        assert extractor.requests_per_second == 1.0
+        assert extractor.burst_size == 1
     
-    @pytest.mark.asyncio
     async def test_context_manager(self, extractor):
         """Test async context manager functionality."""
         async with extractor as ext:
@@ -168,23 +190,15 @@ class TestURLContentExtractor:
         # Session should be closed after context
         assert extractor.session is None or extractor.session.closed
     
-    @pytest.mark.asyncio
     @patch('aiohttp.ClientSession')
-    async def test_full_extraction_workflow(self, mock_session_class, extractor):
+    async def test_full_extraction_workflow(self, mock_session_class, extractor, mocked_session_factory, mocked_response_factory):
         """Test complete URL extraction workflow."""
         # Mock session and response
-        mock_session = Mock()
-        mock_response = Mock()
-        mock_response.status = 200
-        mock_response.headers = {'content-type': 'text/html'}
+        mock_response = mocked_response_factory(headers={'content-type': 'text/html'})
         mock_response.url = 'https://example.com'
-        mock_response.read = AsyncMock(return_value=b'<html><head><title>Test</title></head><body>Content</body></html>')
+        mock_response.content = _streamed_body(b'<html><head><title>Test</title></head><body>', b'Content</body></html>')
         
-        mock_session.get.return_value.__aenter__ = AsyncMock(return_value=mock_response)
-        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=None)
-        mock_session.close = AsyncMock()
-        
-        mock_session_class.return_value = mock_session
+        mock_session_class.return_value = mocked_session_factory(mock_response)
         
         # Test extraction
         async with extractor as ext:
@@ -196,58 +210,70 @@ class TestURLContentExtractor:
         assert result['title'] == 'Test'
         assert 'metadata' in result
     
-    @pytest.mark.asyncio
-    async def test_error_handling_http_error(self, extractor):
+    async def test_error_handling_http_error(self, extractor, mocked_session_factory, mocked_response_factory):
         """Test handling of HTTP errors."""
         with patch('aiohttp.ClientSession') as mock_session_class:
-            mock_session = Mock()
-            mock_response = Mock()
-            mock_response.status = 404
-            
-            # Create a proper ClientResponseError
-            from aiohttp import ClientResponseError, RequestInfo
-            from yarl import URL
-            
-            request_info = RequestInfo(
-                url=URL('https://example.com'),
-                method='GET',
-                headers={},
-                real_url=URL('https://example.com')
-            )
-            
-            mock_session.get.return_value.__aenter__ = AsyncMock(
-                side_effect=ClientResponseError(
-                    request_info=request_info,
-                    history=(),
-                    status=404
-                )
-            )
-            mock_session.close = AsyncMock()
-            mock_session_class.return_value = mock_session
+            mock_session_class.return_value = mocked_session_factory(mocked_response_factory(404))
             
             async with extractor as ext:
                 with pytest.raises(ValueError, match="HTTP 404"):
                     await ext.extract_from_url('https://example.com/notfound')
     
-    @pytest.mark.asyncio
-    async def test_content_size_limit(self, extractor):
+    async def test_content_size_limit(self, extractor, mocked_session_factory, mocked_response_factory):
         """Test content size limiting."""
         extractor.max_content_size = 100  # Small limit for testing
         
         with patch('aiohttp.ClientSession') as mock_session_class:
-            mock_session = Mock()
-            mock_response = Mock()
-            mock_response.status = 200
-            mock_response.headers = {'content-type': 'text/plain', 'content-length': '200'}
-            
-            mock_session.get.return_value.__aenter__ = AsyncMock(return_value=mock_response)
-            mock_session.close = AsyncMock()
-            mock_session_class.return_value = mock_session
+            mock_response = mocked_response_factory(headers={'content-type': 'text/plain', 'content-length': '200'})
+            mock_session_class.return_value = mocked_session_factory(mock_response)
             
             async with extractor as ext:
                 with pytest.raises(ValueError, match="Content too large"):
                     await ext.extract_from_url('https://example.com/large')
     
+    @patch('aiohttp.ClientSession')
+    async def test_content_size_limit_streamed(self, mock_session_class, extractor,
+                                               mocked_session_factory, mocked_response_factory):
+        """Test bodies without Content-Length are cut off once they pass the limit."""
+        extractor.max_content_size = 100
+        
+        mock_response = mocked_response_factory(headers={'content-type': 'text/plain'})
+        mock_response.content = _streamed_body(*([b'x' * 60] * 10))
+        mock_session_class.return_value = mocked_session_factory(mock_response)
+        
+        async with extractor as ext:
+            with pytest.raises(ValueError, match="Content too large"):
+                await ext.extract_from_url('https://example.com/large')
+        
+        # Reading stopped at the chunk that crossed the limit
+        assert mock_response.content.consumed == 2
+    
+    async def test_head_probe_skips_unsupported_content(self, extractor, mock_session):
+        """Test an unsupported HEAD content type skips the body download."""
+        head_response = Mock()
+        head_response.status = 200
+        head_response.headers = {'content-type': 'image/png', 'content-length': '2048'}
+        mock_session.head.return_value.__aenter__ = AsyncMock(return_value=head_response)
+        extractor.session = mock_session
+        
+        with pytest.raises(ValueError, match="Unsupported content type"):
+            await extractor.extract_from_url('https://example.com/logo.png')
+        
+        mock_session.get.assert_not_called()
+    
+    async def test_head_probe_falls_back_to_get(self, extractor, mock_session):
+        """Test servers rejecting HEAD are still fetched with GET."""
+        head_response = Mock()
+        head_response.status = 405
+        head_response.headers = {}
+        mock_session.head.return_value.__aenter__ = AsyncMock(return_value=head_response)
+        extractor.session = mock_session
+        
+        result = await extractor.extract_from_url('https://example.com')
+        
+        assert result['title'] == 'Test Page'
+        mock_session.get.assert_called_once()
+    
     def test_supported_content_types(self, extractor):
         """Test getting supported content types."""
         supported_types = extractor.get_supported_content_types()
@@ -257,7 +283,6 @@ class TestURLContentExtractor:
         assert 'application/pdf' in supported_types
         assert isinstance(supported_types, dict)
     
-    @pytest.mark.asyncio
     async def test_multiple_url_extraction(self, extractor):
         """Test extracting content from multiple URLs."""
         urls = ['https://example1.com', 'https://example2.com']
@@ -275,7 +300,32 @@ class TestURLContentExtractor:
             assert results['https://example1.com']['success'] is True
             assert results['https://example2.com']['success'] is True
     
-    @pytest.mark.asyncio
+    async def test_multiple_url_extraction_concurrent(self, extractor):
+        """Test URLs are extracted concurrently, bounded, and fetched once each."""
+        urls = [f'https://example{i}.com' for i in range(8)] + ['https://example0.com']
+        extractor.max_concurrent_requests = 3
+        in_flight = 0
+        peak_in_flight = 0
+        calls = []
+        
+        async def fake_extract(url):
+            nonlocal in_flight, peak_in_flight
+            calls.append(url)
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {'url': url, 'success': True}
+        
+        with patch.object(extractor, '_extract_single_url_safe', side_effect=fake_extract):
+            async with extractor as ext:
+                results = await ext.extract_multiple_urls(urls)
+        
+        assert list(results) == urls[:8]
+        assert all(results[url]['url'] == url for url in results)
+        assert len(calls) == 8
+        assert peak_in_flight == 3
+    
     async def test_too_many_urls(self, extractor):
         """Test handling too many URLs."""
         urls = [f'https://example{i}.com' for i in range(15)]  # More than limit
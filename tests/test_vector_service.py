@@ -0,0 +1,193 @@
+"""
+Unit tests for VectorService directory ingestion.
+"""
+
+import hashlib
+import json
+import uuid
+import pytest
+from unittest.mock import Mock, patch
+
+chromadb = pytest.importorskip("chromadb")
+np = pytest.importorskip("numpy")
+
+from core.database.vector_service import VectorService
+
+
+class _HashEncoder:
+    """Deterministic stand-in for SentenceTransformer.encode (no model download)."""
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True,
+               normalize_embeddings=False, show_progress_bar=False):
+        vectors = [
+            np.frombuffer(hashlib.sha256(sentence.encode('utf-8')).digest(), dtype=np.uint8)[:16].astype(np.float32) + 1.0
+            for sentence in sentences
+        ]
+        return np.stack(vectors) if vectors else np.zeros((0, 16), dtype=np.float32)
+
+
+def _long_text(label: str, sentences: int = 80) -> str:
+    return ''.join(f"{label} sentence {i} describes a lending rule. " for i in range(sentences))
+
+
+class TestVectorServiceIngestion:
+    
+    @pytest.fixture
+    def service(self):
+        with patch('core.database.vector_service.SENTENCE_TRANSFORMERS_AVAILABLE', False):
+            service = VectorService()
+        service.encoder = _HashEncoder()
+        service.client = chromadb.EphemeralClient()
+        service.collection = service.client.get_or_create_collection(
+            name=f"test_{uuid.uuid4().hex}",
+            metadata={"hnsw:space": "cosine"}
+        )
+        return service
+    
+    async def test_reingest_removes_chunks_of_shrunk_and_deleted_files(self, service, tmp_path):
+        """Re-ingesting drops chunks a shrunk file no longer has and all chunks of a deleted file."""
+        shrinking = tmp_path / 'shrinking.md'
+        removed = tmp_path / 'removed.md'
+        shrinking.write_text(_long_text('Shrinking'))
+        removed.write_text(_long_text('Removed'))
+        
+        await service.add_documents_from_directory(str(tmp_path))
+        assert len(service.collection.get(where={'source': str(shrinking)})['ids']) > 1
+        assert service.collection.get(where={'source': str(removed)})['ids']
+        
+        shrinking.write_text('Only a short paragraph remains in this file.')
+        removed.unlink()
+        stats = await service.add_documents_from_directory(str(tmp_path))
+        
+        assert service.collection.get(where={'source': str(shrinking)})['ids'] == [f"{shrinking}_0"]
+        assert service.collection.get(where={'source': str(removed)})['ids'] == []
+        assert stats['stale_chunks_deleted'] > 0
+    
+    async def test_reingest_keeps_dynamic_content(self, service, tmp_path):
+        """Stale cleanup only touches directory-ingested (static) chunks."""
+        (tmp_path / 'doc.md').write_text('Loan eligibility depends on the credit score.')
+        await service._add_document_batch([{
+            'content': 'Uploaded policy text about repayment schedules.',
+            'source': 'upload:policy.txt',
+            'chunk_id': 0,
+            'source_type': 'upload'
+        }])
+        
+        await service.add_documents_from_directory(str(tmp_path))
+        
+        assert service.collection.get(ids=['upload:policy.txt_0'])['ids'] == ['upload:policy.txt_0']
+    
+    async def test_failed_batch_closes_chunk_stream(self, service, monkeypatch):
+        """A failing batch write still closes the chunk generator (and its process pool)."""
+        closed = []
+        streams = []  # Held here so garbage collection cannot close the generator instead
+        
+        def stream(path):
+            try:
+                yield [{'content': 'Loan eligibility rules.', 'source': 'rules.md', 'chunk_id': 0}]
+                yield [{'content': 'Repayment schedule rules.', 'source': 'repay.md', 'chunk_id': 0}]
+            finally:
+                closed.append(path)
+        
+        def iter_chunks(path):
+            streams.append(stream(path))
+            return streams[-1]
+        
+        async def failing_batch(documents, embeddings=None):
+            raise RuntimeError("vector store down")
+        
+        monkeypatch.setattr(service, 'STREAM_BATCH_SIZE', 1)
+        monkeypatch.setattr(service.document_processor, 'iter_chunks', iter_chunks)
+        monkeypatch.setattr(service, '_add_document_batch', failing_batch)
+        
+        with pytest.raises(RuntimeError):
+            await service.add_documents_from_directory('lending')
+        
+        assert closed == ['lending']
+    
+    async def test_identical_chunks_are_kept_per_capability(self, service, tmp_path):
+        """Identical text in two capabilities is stored for each, so capability search finds both."""
+        shared = 'Aadhaar numbers must be masked before they are logged anywhere.'
+        for capability in ('EKYC', 'OTP'):
+            directory = tmp_path / 'Capabilities' / capability
+            directory.mkdir(parents=True)
+            (directory / 'rules.md').write_text(shared)
+        
+        stats = await service.add_documents_from_directory(str(tmp_path))
+        
+        for capability in ('EKYC', 'OTP'):
+            stored = service.collection.get(where={'capability': capability})
+            assert stored['documents'] == [shared]
+        assert stats['duplicate_chunks_skipped'] == 0
+    
+    async def test_duplicate_chunk_sources_are_recorded(self, service, tmp_path):
+        """Within one capability a duplicate is skipped and its source recorded on the kept chunk."""
+        shared = 'Aadhaar numbers must be masked before they are logged anywhere.'
+        directory = tmp_path / 'Capabilities' / 'EKYC'
+        directory.mkdir(parents=True)
+        (directory / 'first.md').write_text(shared)
+        (directory / 'second.md').write_text(shared)
+        
+        stats = await service.add_documents_from_directory(str(tmp_path))
+        
+        stored = service.collection.get(where={'capability': 'EKYC'})
+        assert len(stored['ids']) == 1
+        kept_source = stored['metadatas'][0]['source']
+        other_source = str(directory / ('second.md' if kept_source.endswith('first.md') else 'first.md'))
+        assert json.loads(stored['metadatas'][0]['duplicate_sources']) == [other_source]
+        assert stats['duplicate_chunks_skipped'] == 1
+
+
+class TestVectorServiceEncoderSelection:
+    
+    def test_onnx_backend_selected(self):
+        """use_onnx loads OnnxSentenceEncoder from the configured path when the backend is installed."""
+        onnx_encoder = _HashEncoder()
+        onnx_class = Mock(return_value=onnx_encoder)
+        sentence_transformer = Mock()
+        
+        with patch('core.database.vector_service.ONNX_AVAILABLE', True), \
+             patch('core.database.vector_service.OnnxSentenceEncoder', onnx_class), \
+             patch('core.database.vector_service.SENTENCE_TRANSFORMERS_AVAILABLE', True), \
+             patch('core.database.vector_service.SentenceTransformer', sentence_transformer):
+            service = VectorService(use_onnx=True, onnx_model_path='/models/minilm-onnx', device='cuda')
+        
+        assert service.encoder is onnx_encoder
+        onnx_class.assert_called_once_with('/models/minilm-onnx', device='cuda')
+        sentence_transformer.assert_not_called()
+    
+    def test_onnx_load_failure_falls_back_to_sentence_transformer(self):
+        """A broken ONNX export falls back to the SentenceTransformer encoder."""
+        fallback = _HashEncoder()
+        
+        with patch('core.database.vector_service.ONNX_AVAILABLE', True), \
+             patch('core.database.vector_service.OnnxSentenceEncoder', Mock(side_effect=OSError('missing model'))), \
+             patch('core.database.vector_service.SENTENCE_TRANSFORMERS_AVAILABLE', True), \
+             patch('core.database.vector_service.SentenceTransformer', Mock(return_value=fallback)):
+            service = VectorService(use_onnx=True)
+        
+        assert service.encoder is fallback
+    
+    def test_onnx_backend_unavailable_uses_sentence_transformer(self):
+        """Without optimum/onnxruntime installed the default encoder is used."""
+        fallback = _HashEncoder()
+        onnx_class = Mock()
+        
+        with patch('core.database.vector_service.ONNX_AVAILABLE', False), \
+             patch('core.database.vector_service.OnnxSentenceEncoder', onnx_class), \
+             patch('core.database.vector_service.SENTENCE_TRANSFORMERS_AVAILABLE', True), \
+             patch('core.database.vector_service.SentenceTransformer', Mock(return_value=fallback)):
+            service = VectorService(use_onnx=True)
+        
+        assert service.encoder is fallback
+        onnx_class.assert_not_called()
+    
+    def test_sentence_transformer_pinned_to_device(self):
+        """The SentenceTransformer encoder is created on the configured device."""
+        sentence_transformer = Mock(return_value=_HashEncoder())
+        
+        with patch('core.database.vector_service.SENTENCE_TRANSFORMERS_AVAILABLE', True), \
+             patch('core.database.vector_service.SentenceTransformer', sentence_transformer):
+            VectorService(device='cuda:1')
+        
+        sentence_transformer.assert_called_once_with('all-MiniLM-L6-v2', device='cuda:1')
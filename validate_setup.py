@@ -6,10 +6,23 @@ Checks all dependencies, configuration, and system readiness.
 
 import sys
 import os
-import importlib
+import atexit
+import importlib.util
+import json
+import shutil
 import subprocess
+import sysconfig
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Distribution names whose import name differs
+_IMPORT_ALIASES = {
+    'python_docx': 'docx',
+    'python_dotenv': 'dotenv',
+    'beautifulsoup4': 'bs4'
+}
 
 def check_python_version() -> Tuple[bool, str]:
     """Check if Python version is compatible."""
@@ -32,57 +45,40 @@ def check_python_dependencies() -> Tuple[bool, List[str]]:
     all_installed = True
     
     for package in required_packages:
-        try:
-            # Handle package name variations
-            import_name = package
-            if package == 'python_docx':
-                import_name = 'docx'
-            elif package == 'python_dotenv':
-                import_name = 'dotenv'
-            elif package == 'PyPDF2':
-                import_name = 'PyPDF2'
-            elif package == 'beautifulsoup4':
-                import_name = 'bs4'
-            
-            importlib.import_module(import_name)
+        # Handle package name variations
+        import_name = _IMPORT_ALIASES.get(package, package)
+        
+        # Locate the package without executing it (heavy packages take seconds to import)
+        if importlib.util.find_spec(import_name) is not None:
             results.append(f"✅ {package}")
-        except ImportError:
+        else:
             results.append(f"❌ {package} (missing)")
             all_installed = False
     
     return all_installed, results
 
-def check_node_and_frontend() -> Tuple[bool, List[str]]:
-    """Check Node.js and frontend build status."""
-    results = []
-    
-    # Check Node.js
+def _check_tool_version(command: str, label: str) -> Tuple[bool, str]:
+    """Run `<command> --version` and report the result."""
     try:
-        result = subprocess.run(['node', '--version'], capture_output=True, text=True)
+        result = subprocess.run([command, '--version'], capture_output=True, text=True)
         if result.returncode == 0:
             version = result.stdout.strip()
-            results.append(f"✅ Node.js {version}")
-            node_ok = True
-        else:
-            results.append("❌ Node.js not found")
-            node_ok = False
+            return True, f"✅ {label} {version}"
+        return False, f"❌ {label} not found"
     except FileNotFoundError:
-        results.append("❌ Node.js not installed")
-        node_ok = False
+        return False, f"❌ {label} not installed"
+
+def check_node_and_frontend() -> Tuple[bool, List[str]]:
+    """Check Node.js and frontend build status."""
+    results = []
     
-    # Check npm
-    try:
-        result = subprocess.run(['npm', '--version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            version = result.stdout.strip()
-            results.append(f"✅ npm {version}")
-            npm_ok = True
-        else:
-            results.append("❌ npm not found")
-            npm_ok = False
-    except FileNotFoundError:
-        results.append("❌ npm not installed")
-        npm_ok = False
+    # Check Node.js and npm; both launches run at once (npm starts its own node process)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        node_future = executor.submit(_check_tool_version, 'node', 'Node.js')
+        npm_future = executor.submit(_check_tool_version, 'npm', 'npm')
+        node_ok, node_message = node_future.result()
+        npm_ok, npm_message = npm_future.result()
+    results.extend([node_message, npm_message])
     
     # Check frontend build
     frontend_dist = Path("frontend/dist")
@@ -151,9 +147,12 @@ def check_directories() -> Tuple[bool, List[str]]:
         ("frontend/", "Frontend directory")
     ]
     
+    # One directory listing instead of a stat() per path; all paths are top-level entries
+    with os.scandir('.') as entries:
+        present = {entry.name for entry in entries}
+    
     for path_str, description in required_paths:
-        path = Path(path_str)
-        if path.exists():
+        if path_str.rstrip('/') in present:
             results.append(f"✅ {description}")
         else:
             results.append(f"❌ {description} missing: {path_str}")
@@ -161,6 +160,20 @@ def check_directories() -> Tuple[bool, List[str]]:
     
     return all_ok, results
 
+@lru_cache(maxsize=1)
+def _get_neo4j_driver(uri: str, user: str, password: str):
+    """Return a Neo4j driver shared across checks in this process, closed at exit."""
+    from neo4j import GraphDatabase
+    
+    driver = GraphDatabase.driver(
+        uri,
+        auth=(user, password),
+        max_connection_pool_size=1,
+        max_connection_lifetime=300
+    )
+    atexit.register(driver.close)
+    return driver
+
 def check_optional_services() -> Tuple[bool, List[str]]:
     """Check optional external services."""
     results = []
@@ -172,14 +185,14 @@ def check_optional_services() -> Tuple[bool, List[str]]:
         
         if config.database.neo4j_password != "password":
             try:
-                driver = GraphDatabase.driver(
+                driver = _get_neo4j_driver(
                     config.database.neo4j_uri,
-                    auth=(config.database.neo4j_user, config.database.neo4j_password)
+                    config.database.neo4j_user,
+                    config.database.neo4j_password
                 )
                 with driver.session() as session:
                     session.run("RETURN 1")
                 results.append("✅ Neo4j connection successful")
-                driver.close()
             except Exception as e:
                 results.append(f"⚠️ Neo4j connection failed: {e}")
         else:
@@ -228,6 +241,59 @@ def run_basic_tests() -> Tuple[bool, List[str]]:
         results.append(f"❌ Basic test failed: {e}")
         return False, results
 
+# Passing results of local checks are reused until one of their inputs changes
+_VALIDATION_CACHE_FILE = Path(".validate_cache.json")
+
+def _cached_check_inputs(check_name: str) -> Optional[List[str]]:
+    """Paths whose mtimes decide whether a check's cached result is still valid (None = never cache)."""
+    if check_name == "Python Version":
+        return []
+    if check_name == "Python Dependencies":
+        # Installing or removing a package touches the site-packages directory
+        return ["requirements.txt", sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]]
+    if check_name == "Node.js & Frontend":
+        return ["frontend/dist/index.html", shutil.which("node") or "node", shutil.which("npm") or "npm"]
+    if check_name == "Directory Structure":
+        return ["."]
+    # Configuration reads exported environment variables that no file mtime tracks, and
+    # service connectivity and application imports can change at any time: always re-check
+    return None
+
+def _validation_cache_key(paths: List[str]) -> str:
+    """Cache key from the interpreter and the mtimes of the given paths."""
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append([path, os.stat(path).st_mtime_ns])
+        except OSError:
+            mtimes.append([path, None])
+    return json.dumps([sys.executable, sys.version, mtimes])
+
+def _load_validation_cache() -> Dict[str, Dict]:
+    """Read cached check results, ignoring a missing or corrupt cache file."""
+    try:
+        return json.loads(_VALIDATION_CACHE_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+def _run_cached_check(check_name: str, check_func: Callable, cache: Dict[str, Dict]) -> Tuple[bool, List[str]]:
+    """Run a check unless the cache holds a passing result for unchanged inputs."""
+    inputs = _cached_check_inputs(check_name)
+    if inputs is None:
+        return check_func()
+    
+    key = _validation_cache_key(inputs)
+    entry = cache.get(check_name)
+    if entry and entry.get("key") == key:
+        return True, entry["messages"]
+    
+    passed, messages = check_func()
+    if passed:
+        cache[check_name] = {"key": key, "messages": messages}
+    else:
+        cache.pop(check_name, None)
+    return passed, messages
+
 def main():
     """Run all validation checks."""
     print("🔍 Dynamic Context Ingestion System - Setup Validation")
@@ -244,23 +310,37 @@ def main():
     ]
     
     all_passed = True
+    cache = _load_validation_cache()
     
-    for check_name, check_func in checks:
-        print(f"\n📋 {check_name}:")
-        print("-" * 30)
+    # The checks are independent and mostly I/O-bound (imports, subprocesses, Neo4j),
+    # so run them all at once and report in the declared order
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [
+            (check_name, executor.submit(_run_cached_check, check_name, check_func, cache))
+            for check_name, check_func in checks
+        ]
         
-        try:
-            passed, messages = check_func()
-            
-            for message in messages:
-                print(f"   {message}")
+        for check_name, future in futures:
+            print(f"\n📋 {check_name}:")
+            print("-" * 30)
             
-            if not passed:
-                all_passed = False
+            try:
+                passed, messages = future.result()
                 
-        except Exception as e:
-            print(f"   ❌ Check failed with error: {e}")
-            all_passed = False
+                for message in messages:
+                    print(f"   {message}")
+                
+                if not passed:
+                    all_passed = False
+                    
+            except Exception as e:
+                print(f"   ❌ Check failed with error: {e}")
+                all_passed = False
+    
+    try:
+        _VALIDATION_CACHE_FILE.write_text(json.dumps(cache, indent=2))
+    except OSError as e:
+        print(f"\n⚠️ Could not write validation cache: {e}")
     
     print("\n" + "=" * 60)
     